@@ -0,0 +1,79 @@
+"""Chat turns per second of SQLiteDatabase against DictDatabase.
+
+A turn is what Completions does per request: get_or_create_chat, then
+append the user and the assistant message. Chats run concurrently on one
+event loop; with more of them in flight the writer commits more turns per
+transaction. max_batch=1 shows SQLite without group commit, and
+BufferedDatabase takes the writes off the turn entirely (flushed at the end,
+one write per chat).
+
+With the default synchronous=NORMAL commits are cheap and group commit
+makes no consistent difference here; it pays off with synchronous=FULL,
+where every transaction waits for the disk. The last column is the
+number of writes per transaction at 64 chats.
+
+Usage: python benchmarks/database_turns.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blackbox.database import BufferedDatabase, DictDatabase, SQLiteDatabase
+
+TURNS = 2000
+ANSWER = "An answer of a typical length. " * 30
+
+
+async def run_turns(database, concurrency: int) -> float:
+    turns_left = TURNS
+
+    async def chat_worker(index: int) -> None:
+        nonlocal turns_left
+        while turns_left > 0:
+            turns_left -= 1
+            chat = await database.get_or_create_chat_async(database, f"chat-{index}")
+            await chat.add_message_async("A question from the user", "user")
+            await chat.add_message_async(ANSWER, "assistant")
+            # The request itself is always awaited; without this a backend whose
+            # calls never suspend (DictDatabase, BufferedDatabase) runs every turn in one worker
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[chat_worker(index) for index in range(concurrency)])
+    await database.flush_async()
+    return TURNS / (time.perf_counter() - start)
+
+
+def main() -> None:
+    print(f"{'backend':<34} " + " ".join(f"{f'{c} chats':>10}" for c in (1, 16, 64)) + f" {'writes/tx':>10}")
+    # On disk, not on a tmpfs, so FULL really waits for the disk
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(__file__))) as directory:
+        backends = [
+            ("DictDatabase", lambda name: DictDatabase()),
+            ("SQLiteDatabase", lambda name: SQLiteDatabase(os.path.join(directory, name))),
+            ("SQLiteDatabase max_batch=1", lambda name: SQLiteDatabase(os.path.join(directory, name), max_batch=1)),
+            ("SQLiteDatabase FULL", lambda name: SQLiteDatabase(os.path.join(directory, name), synchronous="FULL")),
+            ("SQLiteDatabase FULL max_batch=1",
+             lambda name: SQLiteDatabase(os.path.join(directory, name), max_batch=1, synchronous="FULL")),
+            ("BufferedDatabase(SQLite)", lambda name: BufferedDatabase(SQLiteDatabase(os.path.join(directory, name)))),
+        ]
+        for label, factory in backends:
+            rates = []
+            per_transaction = None
+            for concurrency in (1, 16, 64):
+                database = factory(f"{label.replace(' ', '_')}-{concurrency}.db")
+                rates.append(asyncio.run(run_turns(database, concurrency)))
+                backend = database.database if isinstance(database, BufferedDatabase) else database
+                if isinstance(backend, SQLiteDatabase):
+                    per_transaction = backend.batched_writes / max(backend.batches, 1)
+                    backend.close()
+            print(f"{label:<34} " + " ".join(f"{rate:>8.0f}/s" for rate in rates)
+                  + (f" {per_transaction:>10.1f}" if per_transaction is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
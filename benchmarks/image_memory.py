@@ -0,0 +1,107 @@
+"""Peak memory of turning an N-byte image into a /api/chat request body.
+
+Compares the old path (read the file, build the data URI, let aiohttp
+json.dumps the payload and encode it) with the streaming JSONBody, with and
+without an ImageStore. Memory is traced with tracemalloc in multiples of N:
+what the chat keeps holding, the peak while preparing the message and the
+peak while the body is written to a (discarding) connection.
+
+Usage: python benchmarks/image_memory.py [size in MB]
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blackbox.blobs import MemoryBlobStore, MmapBlobStore
+from blackbox.body import JSONBody
+from blackbox.image import ImageStore, ImageTool
+from blackbox.models import Message
+
+IMAGE = os.path.join(os.path.dirname(__file__), "..", "test.jpg")
+
+
+class NullWriter:
+    def __init__(self):
+        self.written = 0
+
+    async def write(self, chunk: bytes) -> None:
+        self.written += len(chunk)
+
+
+def make_file(directory: str, size: int) -> str:
+    with open(IMAGE, "rb") as f:
+        head = f.read()
+    path = os.path.join(directory, "large.jpg")
+    with open(path, "wb") as f:
+        f.write(head)
+        f.write(os.urandom(max(size - len(head), 0)))
+    return path
+
+
+def payload(image: str) -> dict:
+    return {"messages": [Message(role="user", content="What is on the image?", image=image).to_dict()],
+            "maxTokens": 1024}
+
+
+def legacy_prepare(path: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read()
+    mime_type = ImageTool.is_accepted_format(data)
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+async def legacy_send(image: str) -> int:
+    # What aiohttp does for json=payload
+    return len(json.dumps(payload(image)).encode("utf-8"))
+
+
+async def streaming_send(image: str, store=None) -> int:
+    writer = NullWriter()
+    body = JSONBody(payload(image), store)
+    await body.write(writer)
+    assert writer.written == body.size
+    return writer.written
+
+
+def measure(prepare, send):
+    tracemalloc.start()
+    image = prepare()
+    held, prepare_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    asyncio.run(send(image))
+    send_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return held, prepare_peak, send_peak
+
+
+def main() -> None:
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 32 * 1024 * 1024
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_file(directory, size)
+        memory_store = ImageStore(MemoryBlobStore(), memoize_limit=0)
+        mmap_store = ImageStore(MmapBlobStore(os.path.join(directory, "blobs")), memoize_limit=0)
+
+        cases = [
+            ("old: data URI, json=", lambda: legacy_prepare(path), legacy_send),
+            ("data URI, JSONBody", lambda: ImageTool.image_to_base64(path), streaming_send),
+            ("memory store, JSONBody", lambda: memory_store.add(path),
+             lambda image: streaming_send(image, memory_store)),
+            ("mmap store, JSONBody", lambda: mmap_store.add(path),
+             lambda image: streaming_send(image, mmap_store)),
+        ]
+
+        print(f"N = {size / 1024 / 1024:.0f} MB")
+        print(f"{'path':<24} {'held':>6} {'prepare peak':>13} {'send peak':>10}")
+        for label, prepare, send in cases:
+            held, prepare_peak, send_peak = measure(prepare, send)
+            print(f"{label:<24} {held / size:>5.2f}N {prepare_peak / size:>12.2f}N {send_peak / size:>9.2f}N")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Payload bytes and time saved by ImagePreprocessor on test.jpg.
+
+For each setting prints the size of the data URI that ends up in the JSON
+body, the time to build it, and, since the image is re-sent with every later
+turn of the chat, the bytes uploaded over a 10-turn conversation. A 4x
+upscaled copy of test.jpg stands in for a 12 MP phone photo.
+
+Usage: python benchmarks/image_preprocessing.py
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from PIL import Image
+
+from blackbox.image import ImagePreprocessor, ImageTool
+
+IMAGE = os.path.join(os.path.dirname(__file__), "..", "test.jpg")
+TURNS = 10
+ROUNDS = 5
+
+SETTINGS = [
+    ("original", None),
+    ("jpeg q85 1568px", ImagePreprocessor()),
+    ("jpeg q75 1024px", ImagePreprocessor(max_edge=1024, quality=75)),
+    ("webp q80 1568px", ImagePreprocessor(format="WEBP", quality=80)),
+    ("webp q75 1024px", ImagePreprocessor(max_edge=1024, format="WEBP", quality=75)),
+]
+
+
+def phone_photo(data: bytes) -> bytes:
+    with Image.open(BytesIO(data)) as image:
+        large = image.resize((image.width * 4, image.height * 4), Image.BICUBIC)
+    output = BytesIO()
+    large.save(output, format="JPEG", quality=95)
+    return output.getvalue()
+
+
+def measure(fn) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(name: str, data: bytes) -> None:
+    with Image.open(BytesIO(data)) as image:
+        print(f"\n{name}: {image.width}x{image.height}, {len(data) / 1024:.0f} KB")
+    print(f"{'setting':<18} {'data uri':>10} {'saved':>7} {'encode':>9} {f'{TURNS} turns':>10}")
+    original = len(ImageTool.image_to_base64(data))
+    for label, preprocessor in SETTINGS:
+        uri = ImageTool.image_to_base64(data, preprocessor)
+        elapsed = measure(lambda: ImageTool.image_to_base64(data, preprocessor))
+        print(f"{label:<18} {len(uri) / 1024:>8.0f}KB {1 - len(uri) / original:>6.0%} "
+              f"{elapsed * 1000:>7.1f}ms {len(uri) * TURNS / 1024 / 1024:>8.1f}MB")
+
+
+async def loop_latency(preprocessor: ImagePreprocessor, data: bytes, count: int = 8) -> float:
+    """Worst delay of a 1 ms ticker while images are preprocessed."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - start)
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.gather(*[ImageTool.image_to_base64_async(data, preprocessor) for _ in range(count)])
+    done = True
+    await task
+    return worst
+
+
+def main() -> None:
+    with open(IMAGE, "rb") as f:
+        data = f.read()
+    report("test.jpg", data)
+    report("test.jpg upscaled 4x", phone_photo(data))
+
+    large = phone_photo(data)
+    print("\nworst event loop stall while preprocessing 8 large images:")
+    inline = ImagePreprocessor()
+    start = time.perf_counter()
+    for _ in range(8):
+        inline.process(large)
+    print(f"  {'inline (all)':<14} {(time.perf_counter() - start) * 1000:>7.1f}ms")
+    print(f"  {'thread pool':<14} {asyncio.run(loop_latency(ImagePreprocessor(), large)) * 1000:>7.1f}ms")
+    with ProcessPoolExecutor() as executor:
+        preprocessor = ImagePreprocessor(executor=executor)
+        print(f"  {'process pool':<14} {asyncio.run(loop_latency(preprocessor, large)) * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Memory and time per message of the old and the current Message layout.
+
+The old layout is the dataclass Message used to be: a __dict__ per
+instance, a uuid4 string and a utcnow().isoformat() string made on
+creation. The current one is slotted and keeps an int id and an int
+timestamp, formatting the id once, on the first send. Memory is traced
+with tracemalloc for N messages with short content (the text is shared, so
+only the per-message overhead is counted), before and after to_dict().
+Times are per message created, and per payload of a TURNS-message history
+(the best of ROUNDS).
+
+Usage: python benchmarks/message_memory.py [number of messages]
+"""
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blackbox.models import Chat, Message
+
+CONTENT = "A question from the user"
+TURNS = 25
+ROUNDS = 5
+
+
+@dataclass
+class LegacyMessage():
+    role: str
+    content: str
+    image: Optional[str] = None
+    id: str = None
+    timestamp: str = None
+
+    def __post_init__(self):
+        if not self.id:
+            self.id = str(uuid.uuid4())
+        if not self.timestamp:
+            self.timestamp = datetime.utcnow().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.image:
+            return {
+                "id": self.id,
+                "content": self.content,
+                "role": self.role,
+                "data": {
+                    "fileText": "",
+                    "imageBase64": self.image,
+                    "title": None,
+                }
+            }
+        return {
+            "id": self.id,
+            "content": self.content,
+            "role": self.role,
+        }
+
+
+def memory_per_message(cls, count: int, with_dict: bool) -> float:
+    tracemalloc.start()
+    messages = [cls("user", CONTENT) for _ in range(count)]
+    if with_dict:
+        for message in messages:
+            message.to_dict()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del messages
+    return size / count
+
+
+def seconds_per_message(cls, count: int) -> float:
+    start = time.perf_counter()
+    messages = [cls("user", CONTENT) for _ in range(count)]
+    return (time.perf_counter() - start) / count
+
+
+def seconds_per_payload(cls) -> float:
+    # Every turn sends the whole history again
+    messages = [cls("user", CONTENT) for _ in range(TURNS)]
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(1000):
+            [message.to_dict() for message in messages]
+        best = min(best, (time.perf_counter() - start) / 1000)
+    return best
+
+
+def seconds_per_append(count: int) -> float:
+    # Chat bookkeeping without a database: message, overflow and metadata
+    chat = Chat(None)
+    start = time.perf_counter()
+    for _ in range(count):
+        chat._append(CONTENT, "user", None)
+    return (time.perf_counter() - start) / count
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print(f"N = {count} messages")
+    print(f"{'layout':<10} {'bytes':>6} {'+to_dict':>9} {'create':>9} {'payload':>9}")
+    for label, cls in [("old", LegacyMessage), ("slots", Message)]:
+        bare = memory_per_message(cls, count, with_dict=False)
+        with_dict = memory_per_message(cls, count, with_dict=True)
+        create = seconds_per_message(cls, count)
+        payload = seconds_per_payload(cls)
+        print(f"{label:<10} {bare:>6.0f} {with_dict:>9.0f} {create * 1e6:>7.2f}us {payload * 1e6:>7.2f}us")
+    print(f"Chat append: {seconds_per_append(count) * 1e6:.2f}us")
+
+
+if __name__ == "__main__":
+    main()
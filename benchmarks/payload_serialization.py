@@ -0,0 +1,77 @@
+"""CPU cost of serializing /api/chat payloads as a chat grows.
+
+Replays a 25-turn conversation with one image and times building the
+request body on every turn: the old json=payload path (stdlib json.dumps of
+the whole dict) against JSONBody with cached message fragments, using the
+stdlib serializer and orjson when it is installed.
+
+Usage: python benchmarks/payload_serialization.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blackbox.body import JSONBody
+from blackbox.image import ImageTool
+from blackbox.models import Message
+from blackbox.serialization import JSONSerializer, MessageFragments, OrjsonSerializer, orjson
+
+IMAGE = os.path.join(os.path.dirname(__file__), "..", "test.jpg")
+TURNS = 25
+ROUNDS = 5
+ANSWER = "Here is a fairly long answer with some code.\n```python\nprint('привет')\n```\n" * 20
+
+
+def conversation():
+    image = ImageTool.image_to_base64(IMAGE)
+    messages = [Message("user", "What is on the image?", image=image)]
+    for turn in range(TURNS):
+        messages.append(Message("assistant", ANSWER))
+        messages.append(Message("user", f"Follow-up question number {turn}"))
+    return messages
+
+
+def payload(messages):
+    return {"messages": [m.to_dict() for m in messages], "id": "bench", "agentMode": {}, "maxTokens": 1024,
+            "userSelectedModel": "gpt-4o", "validated": "0" * 36}
+
+
+def replay(messages, build) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        elapsed = 0.0
+        for turn in range(1, len(messages) + 1, 2):
+            data = payload(messages[:turn])
+            start = time.perf_counter()
+            build(data)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed)
+    return best
+
+
+def main() -> None:
+    messages = conversation()
+    cases = [("json=payload (old)", lambda data: json.dumps(data).encode("utf-8"))]
+    serializers = [JSONSerializer()] + ([OrjsonSerializer()] if orjson is not None else [])
+    for serializer in serializers:
+        cases.append((f"JSONBody {serializer.name}, no cache",
+                      lambda data, s=serializer: JSONBody(data, fragments=MessageFragments(s, max_bytes=0)).decode()))
+        fragments = MessageFragments(serializer)
+        cases.append((f"JSONBody {serializer.name}, fragments",
+                      lambda data, f=fragments: JSONBody(data, fragments=f).decode()))
+
+    print(f"{TURNS} turns, image {os.path.getsize(IMAGE) // 1024} KB, total time of all turns")
+    baseline = None
+    for label, build in cases:
+        elapsed = replay(messages, build)
+        baseline = baseline or elapsed
+        print(f"  {label:<30} {elapsed * 1000:>8.2f}ms {baseline / elapsed:>6.1f}x")
+    if orjson is None:
+        print("  (orjson is not installed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Per-byte cost of reading /api/chat bodies of growing size.
+
+Compares the old ``full_response += chunk.decode()`` loop with
+``Completions.get_response`` fed from an in-memory body, in nanoseconds per
+byte. The old loop only survives ASCII bodies, so it is timed on those.
+
+Usage: python benchmarks/response_decoding.py
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blackbox.completions import Completions
+from blackbox.database import DictDatabase
+
+CHUNK = 1024
+SIZES_KB = [100, 200, 400, 800]
+ROUNDS = 5
+
+
+def make_body(size: int) -> bytes:
+    # Cyrillic text guarantees characters split between chunks
+    line = "Привет, мир! Hello, world! 你好，世界!\n".encode("utf-8")
+    return (line * (size // len(line) + 1))[:size]
+
+
+def legacy_read(chunks) -> str:
+    full_response = ""
+    for chunk in chunks:
+        full_response += chunk.decode("utf-8")
+    return full_response
+
+
+async def current_read(completions: Completions, chunks, chat) -> str:
+    async def body(url, payload, synchronous=False):
+        for chunk in chunks:
+            yield chunk
+    completions._iter_body = body
+    return await completions.get_response("bench://", {}, chat)
+
+
+def measure(fn) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    client = SimpleNamespace(_log=lambda *args, **kwargs: None, read_size=CHUNK, response_cache=None)
+    completions = Completions(client)
+    database = DictDatabase()
+    chat = database.get_or_create_chat(database, "bench")
+    loop = asyncio.new_event_loop()
+
+    print(f"{'size':>8} {'legacy ascii':>13} {'current ascii':>14} {'current utf-8':>14} {'legacy utf-8':>13}")
+    for size_kb in SIZES_KB:
+        body = make_body(size_kb * 1024)
+        chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+        ascii_chunks = [bytes(len(c)) for c in chunks]
+
+        try:
+            legacy_read(chunks)
+            legacy_utf8 = "ok"
+        except UnicodeDecodeError:
+            legacy_utf8 = "crash"
+
+        legacy = measure(lambda: legacy_read(ascii_chunks))
+        current_ascii = measure(lambda: loop.run_until_complete(current_read(completions, ascii_chunks, chat)))
+        current = measure(lambda: loop.run_until_complete(current_read(completions, chunks, chat)))
+        assert loop.run_until_complete(current_read(completions, chunks, chat)) == body.decode("utf-8")
+
+        print(f"{size_kb:>6}KB {legacy / len(body) * 1e9:>11.2f}ns "
+              f"{current_ascii / len(body) * 1e9:>12.2f}ns {current / len(body) * 1e9:>12.2f}ns {legacy_utf8:>13}")
+
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from blackbox.cache import CacheBackend
+from blackbox.cookies import CookieManager
+from blackbox.exceptions import AccountUnavailableError
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average with bursts of ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def wait_time(self) -> float:
+        """Seconds until a token will be available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+
+class Account:
+    def __init__(self, name: str, cookies: str, rate: float = 1.0, burst: int = 5):
+        self.name = name
+        self.cookies = cookies
+        self.bucket = TokenBucket(rate, burst)
+        self.in_flight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.quarantined = False
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def __repr__(self) -> str:
+        return f"Account({self.name!r}, in_flight={self.in_flight}, failures={self.failures})"
+
+
+class AccountPool:
+    """Routes requests across several Blackbox accounts.
+
+    Each request goes to the least loaded account that is not cooling down
+    and still has rate-limit budget. A chat always goes to the account that
+    created it; at most ``max_chats`` of these pins are kept, each for
+    ``chat_ttl`` seconds after its last request. 429 puts an account into
+    cooldown (honouring Retry-After); repeated 403s quarantine it for
+    ``quarantine_time``.
+    """
+
+    def __init__(self, accounts: Iterable[Account],
+                 cooldown: float = 60.0,
+                 quarantine_after: int = 2,
+                 quarantine_time: float = 900.0,
+                 max_wait: float = 60.0,
+                 max_chats: int = 10000,
+                 chat_ttl: Optional[float] = 24 * 3600.0):
+        self.accounts: List[Account] = list(accounts)
+        if not self.accounts:
+            raise ValueError("Account pool needs at least one account")
+        self.cooldown = cooldown
+        self.quarantine_after = quarantine_after
+        self.quarantine_time = quarantine_time
+        self.max_wait = max_wait
+        self.max_chats = max_chats
+        self.chat_ttl = chat_ttl
+        # chat_id -> (account, time of the last request), least recently used first
+        self._chat_accounts: "OrderedDict[str, Tuple[Account, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_cookie_files(cls, cookie_files: Iterable[str],
+                          rate: float = 1.0,
+                          burst: int = 5,
+                          cache: Optional[CacheBackend] = None,
+                          **kwargs) -> "AccountPool":
+        accounts = []
+        for cookie_file in cookie_files:
+            manager = CookieManager(cookie_file, cache)
+            accounts.append(Account(cookie_file, manager.cookies, rate, burst))
+        return cls(accounts, **kwargs)
+
+    def _sticky(self, chat_id: Optional[str]) -> Optional[Account]:
+        """Account a chat is pinned to; called with the lock held."""
+        if not chat_id:
+            return None
+        entry = self._chat_accounts.get(chat_id)
+        if entry is None:
+            return None
+        account, used = entry
+        if self.chat_ttl is not None and time.monotonic() - used >= self.chat_ttl:
+            del self._chat_accounts[chat_id]
+            return None
+        return account
+
+    def _pin(self, chat_id: str, account: Account) -> None:
+        self._chat_accounts[chat_id] = (account, time.monotonic())
+        self._chat_accounts.move_to_end(chat_id)
+        while len(self._chat_accounts) > self.max_chats:
+            self._chat_accounts.popitem(last=False)
+
+    def _pick(self, chat_id: Optional[str]) -> Optional[Account]:
+        with self._lock:
+            sticky = self._sticky(chat_id)
+            candidates = [sticky] if sticky else sorted(
+                (account for account in self.accounts if account.available),
+                key=lambda account: account.in_flight
+            )
+            for account in candidates:
+                if account.available and account.bucket.try_acquire():
+                    account.in_flight += 1
+                    if chat_id:
+                        self._pin(chat_id, account)
+                    return account
+            return None
+
+    def _wait_time(self, chat_id: Optional[str]) -> float:
+        now = time.monotonic()
+        with self._lock:
+            sticky = self._sticky(chat_id)
+            accounts = [sticky] if sticky else self.accounts
+            return min(max(account.cooldown_until - now, account.bucket.wait_time()) for account in accounts)
+
+    async def acquire(self, chat_id: Optional[str] = None) -> Account:
+        """Wait for an account that may send a request for this chat."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            account = self._pick(chat_id)
+            if account is not None:
+                return account
+            delay = self._wait_time(chat_id)
+            if time.monotonic() + delay > deadline:
+                raise AccountUnavailableError("No account is available to send the request")
+            await asyncio.sleep(max(delay, 0.01))
+
+    def release(self, account: Account, status: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        """Return an account after a request and record how it went."""
+        with self._lock:
+            account.in_flight -= 1
+            if status == 429:
+                account.cooldown_until = time.monotonic() + (retry_after if retry_after is not None else self.cooldown)
+            elif status == 403:
+                account.failures += 1
+                if account.failures >= self.quarantine_after:
+                    account.quarantined = True
+                    account.cooldown_until = time.monotonic() + self.quarantine_time
+            elif status == 200:
+                account.failures = 0
+                account.quarantined = False
+
+    def forget_chat(self, chat_id: str) -> None:
+        with self._lock:
+            self._chat_accounts.pop(chat_id, None)
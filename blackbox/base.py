@@ -1,14 +1,17 @@
 from abc import ABC
-from typing import Optional
+from typing import Optional, Dict, Mapping
+from types import MappingProxyType
 import logging
 from blackbox.cookies import CookieManager
 from blackbox import utils
 from typing import TYPE_CHECKING
 from blackbox.types import DatabaseInterface
 from blackbox.database import DictDatabase
+from blackbox.cache import CacheBackend
 
 if TYPE_CHECKING:
     from blackbox.models import Chat
+    from blackbox.accounts import AccountPool
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +30,9 @@ class BaseAIClient(ABC):
                  cookie_file: Optional[str] = None,
                  chat_history: bool = True,
                  database: Optional[DatabaseInterface] = None,
-                 logging: bool = False):
+                 logging: bool = False,
+                 cache: Optional[CacheBackend] = None,
+                 accounts: Optional["AccountPool"] = None):
         self._setup_logging()
         self.logging = logging
         self.base_url = base_url
@@ -45,15 +50,21 @@ class BaseAIClient(ABC):
 
         self._log("Setting up cookies", "DEBUG")
         self.cookie_file = cookie_file
-        self.cookie_manager = CookieManager(cookie_file if cookie_file else "cookies.json")
+        self.cache = cache
+        # With an account pool the cookie is chosen per request instead
+        self.accounts = accounts
+        self.cookie_manager = None if accounts else CookieManager(cookie_file if cookie_file else "cookies.json", cache)
         
         self._log("Setting up headers", "DEBUG")
-        self.headers = utils.get_headers()
-        self._setup_authentication()
+        headers = utils.get_headers()
+        self._setup_authentication(headers)
+        # Shared by concurrent requests, which layer their own headers on a copy
+        self.headers: Mapping[str, str] = MappingProxyType(headers)
 
-    def _setup_authentication(self) -> None:
+    def _setup_authentication(self, headers: Dict[str, str]) -> None:
         self._log("Setting up authentication", "DEBUG")
-        self.headers["cookie"] = self.cookie_manager.cookies
+        if self.cookie_manager is not None:
+            headers["cookie"] = self.cookie_manager.cookies
 
     def _setup_logging(self) -> None:
         """Configure logging for the client."""
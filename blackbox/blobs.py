@@ -0,0 +1,156 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Union
+
+# Everything base64.b64encode and hashlib accept
+Blob = Union[bytes, memoryview, mmap.mmap]
+
+
+class BlobStore(ABC):
+    """Immutable blobs addressed by the sha256 of their content.
+
+    Putting the same bytes twice stores them once and returns the same key.
+    """
+
+    # Whether blobs outlive the process
+    persistent = False
+
+    @staticmethod
+    def key_for(data: Blob) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data: Blob) -> str:
+        key = self.key_for(data)
+        if key not in self:
+            self._put(key, data)
+        return key
+
+    @abstractmethod
+    def _put(self, key: str, data: Blob) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> Blob:
+        """Content of a blob; raises KeyError if it is not stored."""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def __contains__(self, key: str) -> bool:
+        pass
+
+
+class MemoryBlobStore(BlobStore):
+    """Blobs in memory, gone with the process.
+
+    Holds at most max_bytes (None for no limit); beyond that the least
+    recently used blobs are dropped, and messages still referring to them
+    are sent without their image.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # Least recently used first
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _put(self, key: str, data: Blob) -> None:
+        data = bytes(data)
+        with self._lock:
+            if key in self._blobs:
+                self._blobs.move_to_end(key)
+                return
+            self._blobs[key] = data
+            self._bytes += len(data)
+            # The blob just stored is kept even if it alone is over the limit
+            while self.max_bytes is not None and self._bytes > self.max_bytes and len(self._blobs) > 1:
+                _, evicted = self._blobs.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            self._blobs.move_to_end(key)
+            return self._blobs[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            data = self._blobs.pop(key, None)
+            if data is not None:
+                self._bytes -= len(data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._blobs
+
+
+class DiskBlobStore(BlobStore):
+    """One file per blob under directory, sharded by the first two hex digits.
+
+    Survives restarts, so it fits databases that persist messages.
+    """
+
+    persistent = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _put(self, key: str, data: Blob) -> None:
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            # Same content under the same name, so a concurrent writer winning is fine
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def get(self, key: str) -> Blob:
+        try:
+            with open(self._path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+
+class MmapBlobStore(DiskBlobStore):
+    """DiskBlobStore that memory-maps blobs instead of reading them into memory.
+
+    Pages are loaded by the OS on demand and shared between processes using
+    the same directory.
+    """
+
+    def get(self, key: str) -> Blob:
+        try:
+            with open(self._path(key), "rb") as file:
+                # The map stays valid after the file is closed
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise KeyError(key)
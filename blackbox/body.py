@@ -0,0 +1,126 @@
+import base64
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Union
+
+from aiohttp.abc import AbstractStreamWriter
+from aiohttp.payload import Payload
+
+from blackbox.blobs import Blob
+from blackbox.serialization import MessageFragments
+
+if TYPE_CHECKING:
+    from blackbox.image import ImageStore
+
+# A multiple of 3, so chunks encode to base64 without padding and concatenate cleanly
+ENCODE_CHUNK = 3 * 64 * 1024
+# Images smaller than this are simply serialized along with the rest of the payload
+STREAM_THRESHOLD = 64 * 1024
+
+
+def base64_length(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def iter_base64(data: Blob, chunk_size: int = ENCODE_CHUNK) -> Iterator[bytes]:
+    """Base64 of data in pieces, reading it through a memoryview without copies."""
+    with memoryview(data) as view:
+        for start in range(0, len(view), chunk_size):
+            yield base64.b64encode(view[start:start + chunk_size])
+
+
+def iter_ascii(text: str, chunk_size: int = ENCODE_CHUNK) -> Iterator[bytes]:
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size].encode("ascii")
+
+
+class _Image:
+    """One image of the body: a data URI already in memory, or a blob encoded while writing."""
+
+    def __init__(self, uri: Optional[str] = None, prefix: bytes = b"", blob: Optional[Blob] = None):
+        self.uri = uri
+        self.prefix = prefix
+        self.blob = blob
+
+    @property
+    def size(self) -> int:
+        if self.uri is not None:
+            return len(self.uri)
+        return len(self.prefix) + base64_length(len(self.blob))
+
+    def chunks(self) -> Iterator[bytes]:
+        if self.uri is not None:
+            yield from iter_ascii(self.uri)
+            return
+        yield self.prefix
+        yield from iter_base64(self.blob)
+
+
+class JSONBody(Payload):
+    """Request body of a /api/chat payload, written in pieces.
+
+    Messages come from MessageFragments, so on each turn only the new one is
+    serialized. Large images are left out of the fragments and base64-encoded
+    chunk by chunk straight into the connection, so no complete copy of the
+    JSON document (or, for stored images, of the data URI) is ever built.
+    Content-Length is known upfront. Messages whose stored image is gone
+    are sent without it; their references end up in missing_images.
+    """
+
+    _default_content_type = "application/json"
+
+    def __init__(self, payload: Dict[str, Any],
+                 image_store: Optional["ImageStore"] = None,
+                 fragments: Optional[MessageFragments] = None,
+                 **kwargs):
+        fragments = fragments if fragments is not None else MessageFragments(max_bytes=0)
+        self._parts: List[Union[bytes, _Image]] = [b'{"messages":[']
+        self.missing_images: List[str] = []
+        for index, message in enumerate(payload.get("messages", [])):
+            if index:
+                self._parts.append(b",")
+            data = message.get("data")
+            value = data.get("imageBase64") if data else None
+            try:
+                image = self._image(value, image_store) if isinstance(value, str) else None
+            except KeyError:
+                # Evicted from a bounded store, or stored in memory by an earlier process
+                self.missing_images.append(value)
+                message = {key: item for key, item in message.items() if key != "data"}
+                image = None
+            fragment = fragments.get(message, image_slot=image is not None)
+            if image is None:
+                self._parts.extend(fragment)
+            else:
+                # Base64 and data URI characters never need escaping, so the image fills the slot verbatim
+                self._parts.extend((fragment[0], image, fragment[1]))
+
+        rest = fragments.serializer.dumps({key: value for key, value in payload.items() if key != "messages"})
+        self._parts.append(b"]}" if rest == b"{}" else b"]," + rest[1:])
+
+        super().__init__(payload, **kwargs)
+        self._size = sum(len(part) if isinstance(part, bytes) else part.size for part in self._parts)
+
+    @staticmethod
+    def _image(value: str, image_store: Optional["ImageStore"]) -> Optional[_Image]:
+        if image_store is not None and image_store.is_ref(value):
+            uri = image_store.encoded(value)
+            if uri is not None:
+                return _Image(uri=uri)
+            blob = image_store.blob(value)
+            return _Image(prefix=image_store.uri_prefix(blob).encode("ascii"), blob=blob)
+        if len(value) >= STREAM_THRESHOLD and value.isascii():
+            return _Image(uri=value)
+        return None
+
+    def _iter_bytes(self) -> Iterator[bytes]:
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from part.chunks()
+
+    async def write(self, writer: AbstractStreamWriter) -> None:
+        for chunk in self._iter_bytes():
+            await writer.write(chunk)
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        return b"".join(self._iter_bytes()).decode(encoding, errors)
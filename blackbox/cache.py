@@ -0,0 +1,220 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+def atomic_write_json(path: str, data: Any, **kwargs) -> None:
+    """Write JSON so that readers only ever see the old or the new file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, **kwargs)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileLock:
+    """Exclusive lock between processes on the same host, backed by a lock file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._guard = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None, poll_interval: float = 0.05) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._guard.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                if os.name == "nt":
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                return True
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    self._guard.release()
+                    return False
+                time.sleep(poll_interval)
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if os.name == "nt":
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+            self._guard.release()
+
+
+class CacheBackend(ABC):
+    """Key/value store for small records shared between worker processes.
+
+    Besides get/set it provides a named exclusive lock, so that only one
+    worker refreshes a record while the others wait and then read it.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, record: Dict[str, Any]) -> None:
+        pass
+
+    @abstractmethod
+    def acquire(self, key: str, timeout: Optional[float] = None) -> bool:
+        pass
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        pass
+
+    @contextmanager
+    def lock(self, key: str, timeout: Optional[float] = None) -> Iterator[bool]:
+        """Hold the lock of key; yields False if it could not be taken in time."""
+        acquired = self.acquire(key, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(key)
+
+
+class FileCache(CacheBackend):
+    """Records in one JSON file, replaced atomically and guarded by file locks."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = FileLock(f"{path}.lock")
+        self._locks: Dict[str, FileLock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._read().get(key)
+
+    def set(self, key: str, record: Dict[str, Any]) -> None:
+        # Read-modify-write of the shared file must not interleave with other writers
+        self._write_lock.acquire()
+        try:
+            data = self._read()
+            data[key] = record
+            atomic_write_json(self.path, data)
+        finally:
+            self._write_lock.release()
+
+    def _get_lock(self, key: str) -> FileLock:
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = FileLock(f"{self.path}.{key}.lock")
+            return self._locks[key]
+
+    def acquire(self, key: str, timeout: Optional[float] = None) -> bool:
+        return self._get_lock(key).acquire(timeout)
+
+    def release(self, key: str) -> None:
+        self._get_lock(key).release()
+
+
+class SQLiteCache(CacheBackend):
+    """Records in a SQLite database; locks are leases that expire if a worker dies."""
+
+    def __init__(self, path: str, lease: float = 60.0):
+        self.path = path
+        self.lease = lease
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._guard = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._guard:
+            row = self._connection.execute("SELECT record FROM cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, record: Dict[str, Any]) -> None:
+        with self._guard:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, record, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(record), time.time())
+            )
+
+    def acquire(self, key: str, timeout: Optional[float] = None, poll_interval: float = 0.05) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._try_acquire(key):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+
+    def _try_acquire(self, key: str) -> bool:
+        now = time.time()
+        with self._guard:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT owner, expires_at FROM locks WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] != self._owner and row[1] > now:
+                    connection.execute("ROLLBACK")
+                    return False
+                connection.execute(
+                    "INSERT OR REPLACE INTO locks (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self._owner, now + self.lease)
+                )
+                connection.execute("COMMIT")
+                return True
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def release(self, key: str) -> None:
+        with self._guard:
+            self._connection.execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def close(self) -> None:
+        with self._guard:
+            self._connection.close()
@@ -1,18 +1,98 @@
 from blackbox.base import BaseAIClient
 from blackbox.completions import Completions
 from blackbox.validation import Validation
+from blackbox.session import SessionManager, Timeouts
+from blackbox.runner import LoopThread
+from blackbox.cache import CacheBackend
+from blackbox.accounts import AccountPool
+from blackbox.retry import RetryPolicy, CircuitBreaker, RequestMetrics
+from blackbox.locks import ChatLocks
+from blackbox.response_cache import ResponseCache
+from blackbox.image import ImagePreprocessor, ImageStore
+from blackbox.serialization import JSONSerializer, MessageFragments, default_serializer
 
+import asyncio
 from typing import Optional
 from blackbox.base import DatabaseInterface
+from blackbox.types import DatabaseType
 
 class AIClient(BaseAIClient):
     def __init__(self, cookie_file: Optional[str] = None,
                 chat_history: bool = True,
                  database: Optional[DatabaseInterface] = None,
-                 logging: bool = False):
-        
-        super().__init__(cookie_file=cookie_file, chat_history=chat_history, database=database, logging=logging)
+                 logging: bool = False,
+                 connection_limit: int = 100,
+                 connection_limit_per_host: int = 20,
+                 keepalive_timeout: float = 30.0,
+                 connect_timeout: Optional[float] = 10.0,
+                 first_byte_timeout: Optional[float] = 120.0,
+                 read_timeout: Optional[float] = 60.0,
+                 total_timeout: Optional[float] = 600.0,
+                 read_size: int = 65536,
+                 cache: Optional[CacheBackend] = None,
+                 accounts: Optional[AccountPool] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 image_preprocessor: Optional[ImagePreprocessor] = None,
+                 image_store: Optional[ImageStore] = None,
+                 json_serializer: Optional[JSONSerializer] = None):
+
+        super().__init__(cookie_file=cookie_file, chat_history=chat_history, database=database,
+                         logging=logging, cache=cache, accounts=accounts)
+        self.timeouts = Timeouts(connect=connect_timeout,
+                                 first_byte=first_byte_timeout,
+                                 read=read_timeout,
+                                 total=total_timeout)
+        self.read_size = read_size
+        self.metrics = RequestMetrics()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.circuit_breaker.metrics = self.metrics
+        # Opt-in: identical payloads are answered from here without any request
+        self.response_cache = response_cache
+        # Opt-in: shrink images before they become part of every later payload of the chat
+        self.image_preprocessor = image_preprocessor
+        # Opt-in: messages keep image references instead of data URIs
+        self.image_store = image_store
+        if image_store is not None and not image_store.blobs.persistent and self.database.persistent:
+            self._log("image_store keeps images in memory but the database persists chats: images of chats "
+                      "loaded after a restart will be missing, use a DiskBlobStore", "WARNING", priority=True)
+        # orjson when installed; request bodies reuse the serialized messages of earlier turns
+        self.json_serializer = json_serializer or default_serializer()
+        self.message_fragments = MessageFragments(self.json_serializer)
+        self.session_manager = SessionManager(self,
+                                              limit=connection_limit,
+                                              limit_per_host=connection_limit_per_host,
+                                              keepalive_timeout=keepalive_timeout)
+        self.loop_thread = LoopThread(self)
+        self.chat_locks = ChatLocks()
         self.completions = Completions(self)
         self.validation = Validation(self)
 
+    def close(self) -> None:
+        """Flush buffered chats, close pooled connections of the synchronous API and stop its loop."""
+        if self.database.database_type is not DatabaseType.Asynchronous:
+            self.database.flush()
+        self.loop_thread.close()
+
+    async def aclose(self) -> None:
+        """Flush buffered chats and close pooled connections owned by the client."""
+        if self.database.database_type is DatabaseType.Synchronous:
+            await asyncio.get_running_loop().run_in_executor(None, self.database.flush)
+        else:
+            await self.database.flush_async()
+        await self.session_manager.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.loop_thread.close)
+
+    def __enter__(self) -> "AIClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "AIClient":
+        return self
 
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
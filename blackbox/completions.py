@@ -1,12 +1,19 @@
-from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
-from blackbox.models import AgentMode, Model, Chat, Models
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple, AsyncIterator, Iterator, List, Iterable, Union
+from blackbox.models import AgentMode, Model, Chat, Models, CompletionRequest, BatchResult
+from blackbox.database import DictDatabase
 from blackbox.image import ImageTool
+from blackbox.body import JSONBody
+from blackbox.streaming import ResponseCleaner
+from blackbox.response_cache import ResponseCache, completion_cache_key
+from blackbox import utils
 import requests
 import aiohttp
-from blackbox.exceptions import APIRequestError
+from blackbox.exceptions import APIRequestError, APIStatusError, APITimeoutError, ConnectTimeoutError, IncompleteResponseError, ValidationRejectedError
 import re
 import asyncio
+import codecs
 import time
+import uuid
 import socket
 
 if TYPE_CHECKING:
@@ -17,14 +24,32 @@ class CompletionPayload:
         self.client = client
         self.language_prompt = "Reply only in the language in which I asked the question"
 
-    def _get_chat(self, agent: Optional[AgentMode]) -> Chat:
+    def chat_key(self, agent: Optional[AgentMode], chat_id: Optional[str] = None) -> Optional[str]:
+        """Id of the stored chat a request continues, None if history is disabled."""
+        if not self.client.chat_history:
+            return None
+        return chat_id or (agent.id if agent else "default")
+
+    def _get_chat(self, agent: Optional[AgentMode], chat_id: Optional[str] = None) -> Chat:
+        if self.client.chat_history:
+            return self.client.database.get_or_create_chat(self.client.database, self.chat_key(agent, chat_id))
+        return Chat(self.client.database)
+
+    async def _get_chat_async(self, agent: Optional[AgentMode], chat_id: Optional[str] = None) -> Chat:
         if self.client.chat_history:
-            return self.client.database.get_or_create_chat(self.client.database, agent.id if agent else "default")
+            return await self.client.database.get_or_create_chat_async(self.client.database, self.chat_key(agent, chat_id))
         return Chat(self.client.database)
 
-    async def _get_chat_async(self, agent: Optional[AgentMode]) -> Chat:
+    def new_chat(self) -> Chat:
+        """Create a chat that is not shared with any other request."""
         if self.client.chat_history:
-            return await self.client.database.get_or_create_chat_async(self.client.database, agent.id if agent else "default")
+            return self.client.database.get_or_create_chat(self.client.database, str(uuid.uuid4()))
+        return Chat(self.client.database)
+
+    async def new_chat_async(self) -> Chat:
+        """Create a chat that is not shared with any other request."""
+        if self.client.chat_history:
+            return await self.client.database.get_or_create_chat_async(self.client.database, str(uuid.uuid4()))
         return Chat(self.client.database)
 
     def generate(
@@ -33,13 +58,14 @@ class CompletionPayload:
             agent: Optional[AgentMode],
             model: Model,
             max_tokens: int,
-            image: Optional[str] = None
+            image: Optional[str] = None,
+            chat_id: Optional[str] = None
         ) -> Tuple[Dict[str, Any], Chat]:
-        chat = self._get_chat(agent)
+        chat = self._get_chat(agent, chat_id)
         chat.add_message(self.language_prompt + "\n\n" + message, "user", image)
 
-        validated_value = self.client.validation.fetch_validated()
-        payload, chat = self._get_payload(chat, validated_value, agent, model, max_tokens, image)
+        # The validated value is filled in right before sending, so cached answers never need one
+        payload, chat = self._get_payload(chat, None, agent, model, max_tokens, image)
         return payload, chat
 
     async def generate_async(
@@ -48,19 +74,21 @@ class CompletionPayload:
             agent: Optional[AgentMode],
             model: Model,
             max_tokens: int,
-            image: Optional[str] = None
+            image: Optional[str] = None,
+            chat: Optional[Chat] = None,
+            validated_value: Optional[str] = None,
+            chat_id: Optional[str] = None
         ) -> Tuple[Dict[str, Any], Chat]:
-        chat = await self._get_chat_async(agent)
+        if chat is None:
+            chat = await self._get_chat_async(agent, chat_id)
         await chat.add_message_async(self.language_prompt + "\n\n" + message, "user", image)
 
-        validated_value = await self.client.validation.fetch_validated_async()
-
         payload, chat = self._get_payload(chat, validated_value, agent, model, max_tokens, image)
         return payload, chat
 
     def _get_payload(self,
                      chat: Chat,
-                     validated_value: str,
+                     validated_value: Optional[str],
                      agent: Optional[AgentMode],
                      model: Model,
                      max_tokens: int,
@@ -93,18 +121,24 @@ class CompletionPayload:
 
         if image is None and not agent and model != Models.BLACKBOX:
             payload["userSelectedModel"] = model.id
-        
-        # Update referer header based on agent mode
-        self.client.headers["referer"] = (
-            f"https://www.blackbox.ai/agent/{agent.id}"
-            if agent else
-            "https://www.blackbox.ai/chat"
-        )
 
         return payload, chat
 
-class Completions:
+    def get_headers(self, payload: Dict[str, Any]) -> Dict[str, str]:
+        """Headers for one request: the client's base headers plus a referer for its agent mode."""
+        agent_id = payload.get("agentMode", {}).get("id")
+        return {
+            **self.client.headers,
+            "referer": (
+                f"https://www.blackbox.ai/agent/{agent_id}"
+                if agent_id else
+                "https://www.blackbox.ai/chat"
+            ),
+        }
 
+class Completions:
+    # Statuses returned when the validated value is no longer accepted
+    _rejected_statuses = (401, 403)
 
     def __init__(self, client: "AIClient"):
         self.client = client
@@ -125,66 +159,455 @@ class Completions:
         cleaned_text = re.sub(r'Generated by BLACKBOX\.AI, try unlimited chat https://www\.blackbox\.ai\n\n?', '', cleaned_text)
         return cleaned_text
     
-    async def get_response(self, url: str, payload: Dict[str, Any], chat: Chat, synchronous: bool = False):
-        async with aiohttp.ClientSession(headers=self.client.headers) as session:
-            async with session.post(url, json=payload) as response:
+    async def _iter_body(self, url: str, payload: Dict[str, Any], synchronous: bool = False) -> AsyncIterator[bytes]:
+        """Post to /api/chat and yield the raw body, retrying transient failures.
+
+        Retries follow client.retry_policy and only happen before any part of
+        the body was received; client.circuit_breaker fails fast while the
+        endpoint is unhealthy.
+        """
+        policy = self.client.retry_policy
+        breaker = self.client.circuit_breaker
+        metrics = self.client.metrics
+        attempt = 0
+
+        while True:
+            attempt += 1
+            breaker.allow()
+            metrics.increment("requests")
+            received = False
+            outcome = None
+            try:
+                async for chunk in self._post_with_token(url, payload, synchronous):
+                    received = True
+                    yield chunk
+                outcome = True
+                return
+            except Exception as e:
+                if self._is_endpoint_failure(e):
+                    outcome = False
+                elif isinstance(e, APIStatusError):
+                    outcome = True
+                # Anything else (no account, a broken payload...) never reached the endpoint
+                retry_after = e.retry_after if isinstance(e, APIStatusError) else None
+                delay = policy.delay(attempt, retry_after)
+                if received or attempt >= policy.max_attempts or not self._is_retryable(e) or delay > policy.max_delay:
+                    metrics.increment("failures")
+                    raise
+                metrics.increment("retries")
+                self.client._log(f"Request to {url} failed ({str(e)}), retry {attempt} in {delay:.2f}s", "WARNING")
+            finally:
+                if outcome is None and not received:
+                    breaker.release()
+                elif outcome is None or outcome:
+                    # A stream closed by the consumer was fine as far as it went
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+
+            await asyncio.sleep(delay)
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, APIStatusError):
+            return error.status in self.client.retry_policy.retry_statuses
+        # Other timeouts happen after the request was sent and could have it answered twice
+        return isinstance(error, (aiohttp.ClientConnectionError, ConnectTimeoutError))
+
+    @staticmethod
+    def _is_endpoint_failure(error: Exception) -> bool:
+        """Whether an error says the endpoint itself is unhealthy."""
+        if isinstance(error, APIStatusError):
+            return error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, APITimeoutError, IncompleteResponseError))
+
+    async def _post_with_token(self, url: str, payload: Dict[str, Any], synchronous: bool = False) -> AsyncIterator[bytes]:
+        """Like :meth:`_post`, retrying once with a fresh token if the API rejects it."""
+        if not payload.get("validated"):
+            payload["validated"] = await self.client.validation.fetch_validated_async()
+        try:
+            async for chunk in self._post(url, payload, synchronous, token_retry=True):
+                yield chunk
+            return
+        except ValidationRejectedError as e:
+            self.client._log(f"Validated value was rejected, retrying: {str(e)}", "WARNING")
+
+        self.client.validation.invalidate(payload.get("validated"))
+        payload["validated"] = await self.client.validation.fetch_validated_async()
+        async for chunk in self._post(url, payload, synchronous):
+            yield chunk
+
+    async def _post(self, url: str, payload: Dict[str, Any], synchronous: bool = False,
+                    token_retry: bool = False) -> AsyncIterator[bytes]:
+        """Post to /api/chat and yield raw body chunks until the response is complete.
+
+        The end of the answer is taken from EOF as delimited by the transfer
+        framing; a body cut short raises IncompleteResponseError and a missed
+        deadline raises APITimeoutError. token_retry tells that a rejected
+        token will be retried with a fresh one, so the rejection is not held
+        against the account.
+        """
+        timeouts = self.client.timeouts
+        session = await self.client.session_manager.get()
+        headers = self.completion_payload.get_headers(payload)
+        accounts = self.client.accounts
+        account = None
+        status = None
+        retry_after = None
+        if accounts is not None:
+            # Without history every request has a chat of its own, nothing to keep on one account
+            account = await accounts.acquire(payload.get("id") if self.client.chat_history else None)
+            headers["cookie"] = account.cookies
+        try:
+            body = JSONBody(payload, self.client.image_store, self.client.message_fragments)
+            if body.missing_images:
+                self.client._log(f"Sending {len(body.missing_images)} message(s) without their image, "
+                                 f"no longer in the image store: {', '.join(body.missing_images)}", "WARNING")
+            loop = asyncio.get_running_loop()
+            # One deadline from sending the request to the first body chunk, waiting for the headers included
+            first_byte_deadline = loop.time() + timeouts.first_byte if timeouts.first_byte is not None else None
+            try:
+                response = await asyncio.wait_for(
+                    session.post(url, data=body, headers=headers, timeout=timeouts.to_client_timeout()),
+                    timeout=timeouts.first_byte)
+            except aiohttp.ConnectionTimeoutError:
+                raise
+            except asyncio.TimeoutError:
+                raise APITimeoutError(f"Timed out waiting for response headers from {url}")
+            async with response:
                 self.client._log(f"Received {'synchronous' if synchronous else 'asynchronous'} response from {url}", "RESPONSE")
+                status = response.status
+                retry_after = utils.parse_retry_after(response.headers.get("Retry-After"))
+                if response.status in self._rejected_statuses:
+                    raise ValidationRejectedError(f"Failed to create chat: {response.status} {await response.text()}",
+                                                  response.status, retry_after)
                 if response.status != 200:
-                    raise APIRequestError(f"Failed to create chat: {response.status} {await response.text()}")
-
-                try:
-                    full_response = ""
-                    
-                    while True:
-                        try:
-                            chunk = await asyncio.wait_for(
-                                response.content.read(1024),
-                                timeout=1.0
-                            )
-                            if not chunk:
-                                break
-                            
-                            full_response += chunk.decode('utf-8')
-                            
-                        except asyncio.TimeoutError:
-                            break
-                    
-                    processed_response = self._process_response(full_response)
-                    await chat.add_message_async(processed_response, "assistant")
-                    return processed_response
-                    
-                except Exception as e:
-                    raise APIRequestError(f"Failed to process response: {str(e)}")
+                    raise APIStatusError(f"Failed to create chat: {response.status} {await response.text()}",
+                                         response.status, retry_after)
+
+                first = True
+                while True:
+                    if not first:
+                        timeout = timeouts.read
+                    elif first_byte_deadline is not None:
+                        timeout = max(first_byte_deadline - loop.time(), 0)
+                    else:
+                        timeout = None
+                    try:
+                        chunk = await asyncio.wait_for(response.content.read(self.client.read_size), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        stage = "first byte" if first else "next chunk"
+                        raise APITimeoutError(f"Timed out waiting for {stage} from {url}")
+                    if not chunk:
+                        break
+                    first = False
+                    yield chunk
+
+        except aiohttp.ClientPayloadError as e:
+            raise IncompleteResponseError(f"Response from {url} was truncated: {str(e)}")
+        except aiohttp.ConnectionTimeoutError:
+            # Raised before anything was sent, so the request is safe to repeat
+            raise ConnectTimeoutError(f"Timed out connecting to {url}")
+        except asyncio.TimeoutError:
+            raise APITimeoutError(f"Request to {url} exceeded its deadline")
+        finally:
+            if account is not None:
+                if token_retry and status in self._rejected_statuses:
+                    # Most likely a rotated token; only a rejection of the fresh one counts
+                    status = None
+                accounts.release(account, status, retry_after)
+
+    def _prepare_image(self, image: Any) -> str:
+        """What a message keeps of an image: a reference into the image store, or the data URI."""
+        if self.client.image_store is not None:
+            return self.client.image_store.add(image, self.client.image_preprocessor)
+        return ImageTool.image_to_base64(image, self.client.image_preprocessor)
+
+    async def _prepare_image_async(self, image: Any) -> str:
+        if self.client.image_store is not None:
+            return await self.client.image_store.add_async(image, self.client.image_preprocessor)
+        return await ImageTool.image_to_base64_async(image, self.client.image_preprocessor)
+
+    async def get_response(self, url: str, payload: Dict[str, Any], chat: Chat, synchronous: bool = False):
+        processed_response = await self._read_response(url, payload, synchronous)
+        await chat.add_message_async(processed_response, "assistant")
+        return processed_response
+
+    async def _read_response(self, url: str, payload: Dict[str, Any], synchronous: bool = False) -> str:
+        cache = self.client.response_cache
+        cache_key = completion_cache_key(payload) if cache is not None else None
+        if cache_key is not None:
+            cached = await cache.get_async(cache_key)
+            if cached is not None:
+                self.client._log("Using cached response", "DEBUG")
+                return cached
+
+        processed_response = await self._fetch_response(url, payload, synchronous)
+        if cache_key is not None:
+            await self._cache_response(cache, cache_key, processed_response)
+        return processed_response
+
+    async def _cache_response(self, cache: ResponseCache, cache_key: str, response: str) -> None:
+        # The answer is already paid for, a cache that cannot store it must not lose it
+        try:
+            await cache.set_async(cache_key, response)
+        except Exception as e:
+            self.client._log(f"Failed to cache response: {str(e)}", "WARNING")
+
+    async def _fetch_response(self, url: str, payload: Dict[str, Any], synchronous: bool = False) -> str:
+        try:
+            # Multi-byte characters may be split between chunks, so decode incrementally
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            parts: List[str] = []
+
+            async for chunk in self._iter_body(url, payload, synchronous):
+                parts.append(decoder.decode(chunk))
+            parts.append(decoder.decode(b"", final=True))
+
+            full_response = "".join(parts)
+
+            return self._process_response(full_response)
+
+        except APIRequestError:
+            raise
+        except Exception as e:
+            raise APIRequestError(f"Failed to process response: {str(e)}")
+
+    async def _stream_response(self, url: str, payload: Dict[str, Any], model: Model) -> AsyncIterator[str]:
+        """Yield cleaned text increments of /api/chat as they arrive."""
+        cache = self.client.response_cache
+        cache_key = completion_cache_key(payload) if cache is not None else None
+        if cache_key is not None:
+            cached = await cache.get_async(cache_key)
+            if cached is not None:
+                self.client._log("Using cached response", "DEBUG")
+                yield cached
+                return
+
+        parts: List[str] = []
+        async for text in self._stream_fresh_response(url, payload, model):
+            parts.append(text)
+            yield text
+
+        if cache_key is not None:
+            await self._cache_response(cache, cache_key, "".join(parts))
+
+    async def _stream_fresh_response(self, url: str, payload: Dict[str, Any], model: Model) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        cleaner = ResponseCleaner()
+        buffered: List[str] = []
+
+        async for chunk in self._iter_body(url, payload):
+            text = cleaner.feed(decoder.decode(chunk))
+            if not text:
+                continue
+            if model.supports_streaming:
+                yield text
+            else:
+                buffered.append(text)
+
+        buffered.append(cleaner.feed(decoder.decode(b"", final=True)))
+        buffered.append(cleaner.flush())
+        tail = "".join(buffered)
+        if tail:
+            yield tail
+
+    def create_chat(self) -> str:
+        """Start a new conversation and return its chat_id for later generate* calls."""
+        return self.completion_payload.new_chat().chat_id
+
+    async def create_chat_async(self) -> str:
+        """Start a new conversation and return its chat_id for later generate* calls."""
+        return (await self.completion_payload.new_chat_async()).chat_id
+
+    def delete_chat(self, chat_id: str) -> None:
+        """Delete a conversation along with the account it is pinned to."""
+        with self.client.chat_locks.hold_sync(chat_id):
+            self.client.database.delete_chat(chat_id)
+        if self.client.accounts is not None:
+            self.client.accounts.forget_chat(chat_id)
+
+    async def delete_chat_async(self, chat_id: str) -> None:
+        async with self.client.chat_locks.hold(chat_id):
+            await self.client.database.delete_chat_async(chat_id)
+        if self.client.accounts is not None:
+            self.client.accounts.forget_chat(chat_id)
 
     def generate(self, message: str,
                agent: Optional[AgentMode],
                model: Model,
                max_tokens: int,
-               image: Optional[str] = None):
-        
+               image: Optional[str] = None,
+               chat_id: Optional[str] = None):
+        """Send a message and return the answer.
+
+        Without chat_id the conversation of the agent (or the default one) is
+        continued. Requests on the same chat are handled one at a time.
+        """
         url = f"{self.client.base_url}/api/chat"
         if image is not None:
-            image = ImageTool.image_to_base64(image)
+            image = self._prepare_image(image)
 
-        payload, chat = self.completion_payload.generate(message, agent, model, max_tokens, image)
+        with self.client.chat_locks.hold_sync(self.completion_payload.chat_key(agent, chat_id)):
+            payload, chat = self.completion_payload.generate(message, agent, model, max_tokens, image, chat_id)
 
-        self.client._log(f"Sending synchronous request to {url}", "REQUEST")
+            self.client._log(f"Sending synchronous request to {url}", "REQUEST")
 
-        return asyncio.run(self.get_response(url, payload, chat, synchronous=True))
+            processed_response = self.client.loop_thread.run(self._read_response(url, payload, synchronous=True))
+            chat.add_message(processed_response, "assistant")
+            return processed_response
 
     async def generate_async(self, message: str,
                agent: Optional[AgentMode],
                model: Model,
                max_tokens: int,
-               image: Optional[str] = None):
-        
+               image: Optional[str] = None,
+               chat_id: Optional[str] = None):
+        """Asynchronous counterpart of :meth:`generate`."""
+        url = f"{self.client.base_url}/api/chat"
+        if image is not None:
+            image = await self._prepare_image_async(image)
+
+        async with self.client.chat_locks.hold(self.completion_payload.chat_key(agent, chat_id)):
+            payload, chat = await self.completion_payload.generate_async(message, agent, model, max_tokens, image,
+                                                                         chat_id=chat_id)
+
+            self.client._log(f"Sending asynchronous request to {url}", "REQUEST")
+
+            return await self.get_response(url, payload, chat, synchronous=False)
+
+    async def stream_async(self, message: str,
+               agent: Optional[AgentMode],
+               model: Model,
+               max_tokens: int,
+               image: Optional[str] = None,
+               chat_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the answer in pieces as they arrive.
+
+        Models without ``supports_streaming`` yield the whole answer at once.
+        The assistant message is added to the chat only after the stream ended;
+        the chat stays locked for other requests until then.
+        """
+        url = f"{self.client.base_url}/api/chat"
+        if image is not None:
+            image = await self._prepare_image_async(image)
+
+        async with self.client.chat_locks.hold(self.completion_payload.chat_key(agent, chat_id)):
+            payload, chat = await self.completion_payload.generate_async(message, agent, model, max_tokens, image,
+                                                                         chat_id=chat_id)
+
+            self.client._log(f"Sending asynchronous streaming request to {url}", "REQUEST")
+
+            parts: List[str] = []
+            async for text in self._stream_response(url, payload, model):
+                parts.append(text)
+                yield text
+
+            await chat.add_message_async("".join(parts), "assistant")
+
+    def stream(self, message: str,
+               agent: Optional[AgentMode],
+               model: Model,
+               max_tokens: int,
+               image: Optional[str] = None,
+               chat_id: Optional[str] = None) -> Iterator[str]:
+        """Synchronous counterpart of :meth:`stream_async`."""
+        url = f"{self.client.base_url}/api/chat"
+        if image is not None:
+            image = self._prepare_image(image)
+
+        with self.client.chat_locks.hold_sync(self.completion_payload.chat_key(agent, chat_id)):
+            payload, chat = self.completion_payload.generate(message, agent, model, max_tokens, image, chat_id)
+
+            self.client._log(f"Sending synchronous streaming request to {url}", "REQUEST")
+
+            parts: List[str] = []
+            for text in self.client.loop_thread.iterate(self._stream_response(url, payload, model)):
+                parts.append(text)
+                yield text
+
+            chat.add_message("".join(parts), "assistant")
+
+    async def _generate_batch_item(self, request: CompletionRequest) -> str:
         url = f"{self.client.base_url}/api/chat"
+        image = request.image
         if image is not None:
-            image = ImageTool.image_to_base64(image)
+            image = await self._prepare_image_async(image)
+
+        # Requests without a chat_id get a fresh chat nobody else can touch. It lives in a
+        # database of its own, dropped with it, so large batches don't pile up in the client's
+        chat_key = self.completion_payload.chat_key(request.agent, request.chat_id) if request.chat_id else None
+        async with self.client.chat_locks.hold(chat_key):
+            chat = None if request.chat_id else Chat(DictDatabase())
+            payload, chat = await self.completion_payload.generate_async(
+                request.message, request.agent, request.model, request.max_tokens, image,
+                chat=chat, chat_id=request.chat_id
+            )
+            return await self.get_response(url, payload, chat, synchronous=False)
 
-        payload, chat = await self.completion_payload.generate_async(message, agent, model, max_tokens, image)
+    async def iter_many_async(self,
+                              requests: Iterable[Union[CompletionRequest, Dict[str, Any]]],
+                              concurrency: int = 8) -> AsyncIterator[BatchResult]:
+        """Run many independent completions, yielding results as they finish.
 
-        self.client._log(f"Sending asynchronous request to {url}", "REQUEST")
+        At most ``concurrency`` requests are in flight at once. Every request
+        gets its own chat unless it names a chat_id; all of them share the client session and a single
+        validated token, fetched on the first request that is not answered from the response cache.
+        A failing request is reported through
+        ``BatchResult.error`` instead of aborting the batch.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
 
-        return await self.get_response(url, payload, chat, synchronous=False)
+        pending = enumerate(requests)
+        results: "asyncio.Queue[Optional[BatchResult]]" = asyncio.Queue()
+
+        async def worker() -> None:
+            try:
+                # The shared iterator hands every request to exactly one worker
+                for index, request in pending:
+                    try:
+                        # Converted here, so a malformed item fails alone instead of ending the iteration
+                        request = CompletionRequest.from_value(request)
+                        response = await self._generate_batch_item(request)
+                        result = BatchResult(index, request, response=response)
+                    except Exception as e:
+                        self.client._log(f"Batch request {index} failed: {str(e)}", "ERROR")
+                        result = BatchResult(index, request, error=e)
+                    await results.put(result)
+            finally:
+                await results.put(None)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+        try:
+            running = len(workers)
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def generate_many_async(self,
+                                  requests: Iterable[Union[CompletionRequest, Dict[str, Any]]],
+                                  concurrency: int = 8,
+                                  ordered: bool = True) -> List[BatchResult]:
+        """Run many independent completions with bounded concurrency.
+
+        Results are returned in input order, or in completion order when
+        ``ordered`` is False.
+        """
+        results = [result async for result in self.iter_many_async(requests, concurrency)]
+        if ordered:
+            results.sort(key=lambda result: result.index)
+        return results
 
+    def generate_many(self,
+                      requests: Iterable[Union[CompletionRequest, Dict[str, Any]]],
+                      concurrency: int = 8,
+                      ordered: bool = True) -> List[BatchResult]:
+        """Synchronous counterpart of :meth:`generate_many_async`."""
+        return self.client.loop_thread.run(self.generate_many_async(requests, concurrency, ordered))
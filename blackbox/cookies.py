@@ -3,15 +3,25 @@ import os
 import re
 from datetime import datetime
 from typing import Dict, Optional
+from blackbox.cache import CacheBackend, atomic_write_json
 
 class CookieManager:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, cache: Optional[CacheBackend] = None):
         self.file_path = file_path
+        self.cache = cache
+        self.cache_key = "cookies"
         self.cookies = None
 
         self._load_cookies()
 
     def _load_cookies(self) -> None:
+        if not os.path.exists(self.file_path) and self.cache:
+            # Another worker may already have shared the cookies
+            cookie_data = self.cache.get(self.cache_key)
+            if cookie_data:
+                self.cookies = self._format_cookies(cookie_data)
+                return
+
         if not os.path.exists(self.file_path):
             try:
                 cookies_request = input("Enter your cookies: ")
@@ -21,11 +31,20 @@ class CookieManager:
         
         with open(self.file_path, 'r') as file:
             try:
-                self.cookies = json.load(file)
-                self.cookies = '; '.join(f"{key}={value}" for key, value in self.cookies.items())
+                cookie_data = json.load(file)
+                self.cookies = self._format_cookies(cookie_data)
             except json.JSONDecodeError as e:
                 raise ValueError(f"Failed to parse JSON: {e}")
 
+        if self.cache:
+            self.cache.set(self.cache_key, cookie_data)
+
+    @staticmethod
+    def _format_cookies(cookie_data: Dict) -> str:
+        # Files written by save_cookies nest the cookies next to their metadata
+        cookies = cookie_data.get("cookies", cookie_data)
+        return '; '.join(f"{key}={value}" for key, value in cookies.items())
+
     def parse_cookies(self, cookie_string: str) -> Dict[str, str]:
         try:
             cookie_data = {
@@ -45,8 +64,9 @@ class CookieManager:
 
     def save_cookies(self, cookie_data: Dict[str, str]) -> None:
         try:
-            with open(self.file_path, 'w') as file:
-                json.dump(cookie_data, file, indent=4)
+            atomic_write_json(self.file_path, cookie_data, indent=4)
+            if self.cache:
+                self.cache.set(self.cache_key, cookie_data)
         except Exception as e:
             raise ValueError(f"Failed to save cookies: {e}")
 
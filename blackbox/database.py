@@ -1,77 +1,878 @@
 from abc import ABC, abstractmethod
 from enum import Enum
-from blackbox.models import Chat
-from typing import List, Dict, Any
+from blackbox.models import Chat, Message
+from typing import List, Dict, Any, Callable, Optional, Tuple
 from blackbox.types import DatabaseInterface, DatabaseType
+from blackbox.locks import ChatLock
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import Future
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
 
 class DictDatabase(DatabaseInterface):
-    def __init__(self):
+    """Chats kept in memory.
+
+    Unbounded by default. With max_chats, max_bytes (approximate size of
+    the messages, images included) or idle_ttl set, the least recently used
+    chats are evicted; with a spill database they are saved there first and
+    reloaded transparently by get_or_create_chat when needed again.
+    """
+
+    # Rough per-message overhead on top of its text, for max_bytes
+    MESSAGE_OVERHEAD = 256
+
+    def __init__(self,
+                 max_chats: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 idle_ttl: Optional[float] = None,
+                 spill: Optional[DatabaseInterface] = None):
         super().__init__(DatabaseType.Universal)
-        self.chats: Dict[str, Chat] = {}
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        # Least recently used first
+        self.chats: "OrderedDict[str, Chat]" = OrderedDict()
         self.metadata: Dict[str, Dict[str, Any]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._accessed: Dict[str, float] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
 
-    def save_chat(self, chat: Chat) -> None:
-        self.chats[chat.chat_id] = chat
-        self.metadata[chat.chat_id].update({
+    @property
+    def persistent(self) -> bool:
+        return self.spill is not None and self.spill.persistent
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_chats is not None or self.max_bytes is not None or self.idle_ttl is not None
+
+    def _chat_size(self, chat: Chat) -> int:
+        return sum(len(m.content) + len(m.image or "") + self.MESSAGE_OVERHEAD for m in chat.messages)
+
+    def _touch(self, chat_id: str) -> None:
+        self.chats.move_to_end(chat_id)
+        self._accessed[chat_id] = time.monotonic()
+
+    def _put(self, chat: Chat) -> None:
+        with self._lock:
+            self.chats[chat.chat_id] = chat
+            self._touch(chat.chat_id)
+            if self.bounded:
+                size = self._chat_size(chat)
+                self._bytes += size - self._sizes.get(chat.chat_id, 0)
+                self._sizes[chat.chat_id] = size
+
+    def _remove(self, chat_id: str) -> Optional[Chat]:
+        with self._lock:
+            chat = self.chats.pop(chat_id, None)
+            self.metadata.pop(chat_id, None)
+            self._accessed.pop(chat_id, None)
+            self._bytes -= self._sizes.pop(chat_id, 0)
+            return chat
+
+    def _collect_evicted(self, keep: Optional[str] = None) -> List[Chat]:
+        """Drop chats over the limits from memory and return them; keep is never evicted."""
+        if not self.bounded:
+            return []
+        evicted = []
+        now = time.monotonic()
+        with self._lock:
+            for chat_id in list(self.chats):
+                if chat_id == keep:
+                    continue
+                expired = self.idle_ttl is not None and now - self._accessed[chat_id] >= self.idle_ttl
+                over = (
+                    (self.max_chats is not None and len(self.chats) > self.max_chats) or
+                    (self.max_bytes is not None and self._bytes > self.max_bytes)
+                )
+                if not expired and not over:
+                    # Everything after this one was used more recently
+                    break
+                evicted.append(self._remove(chat_id))
+        return evicted
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        for chat in self._collect_evicted(keep):
+            if self.spill is not None:
+                self.spill.save_chat(chat)
+
+    async def _evict_async(self, keep: Optional[str] = None) -> None:
+        for chat in self._collect_evicted(keep):
+            if self.spill is not None:
+                await self.spill.save_chat_async(chat)
+
+    def _clear_memory(self) -> None:
+        with self._lock:
+            self.chats.clear()
+            self.metadata.clear()
+            self._sizes.clear()
+            self._accessed.clear()
+            self._bytes = 0
+
+    def _update_metadata(self, chat: Chat) -> None:
+        self.metadata.setdefault(chat.chat_id, {}).update({
             'message_count': len(chat.get_messages()),
             'last_updated': datetime.utcnow().isoformat()
         })
 
+    def _resident(self, chat_id: str) -> Optional[Chat]:
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is not None:
+                self._touch(chat_id)
+            return chat
+
+    def _adopt(self, database: DatabaseInterface, chat: Chat) -> Chat:
+        """Make a chat loaded from the spill database resident again."""
+        with self._lock:
+            resident = self.chats.get(chat.chat_id)
+            if resident is not None:
+                return resident
+            chat.database = database
+            self._put(chat)
+            self._update_metadata(chat)
+            return chat
+
+    def _create(self, database: DatabaseInterface, chat_id: str) -> Chat:
+        with self._lock:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                chat = Chat(database, chat_id)
+                self._put(chat)
+                self.metadata[chat_id] = {}
+            return chat
+
+    def _all_chats(self, spilled: List[Chat]) -> List[Chat]:
+        with self._lock:
+            chats = list(self.chats.values())
+        return chats + [chat for chat in spilled if chat.chat_id not in self.chats]
+
+    def save_chat(self, chat: Chat) -> None:
+        self._put(chat)
+        self._update_metadata(chat)
+        self._evict(keep=chat.chat_id)
+
     def get_chat(self, chat_id: str) -> Chat:
-        return self.chats.get(chat_id)
+        chat = self._resident(chat_id)
+        if chat is None and self.spill is not None:
+            spilled = self.spill.get_chat(chat_id)
+            if spilled is not None:
+                chat = self._adopt(self, spilled)
+                self._evict(keep=chat_id)
+        return chat
     
     def get_or_create_chat(self, database: DatabaseInterface, chat_id: str) -> Chat:
-        if chat_id not in self.chats:
-            self.chats[chat_id] = Chat(database, chat_id)
-            self.metadata[chat_id] = {}
-        return self.chats[chat_id]
+        chat = self._resident(chat_id)
+        if chat is None:
+            spilled = self.spill.get_chat(chat_id) if self.spill is not None else None
+            chat = self._adopt(database, spilled) if spilled is not None else self._create(database, chat_id)
+            self._evict(keep=chat_id)
+        return chat
     
     def delete_chat(self, chat_id: str) -> None:
-        self.chats.pop(chat_id, None)
-        self.metadata.pop(chat_id, None)
+        self._remove(chat_id)
+        if self.spill is not None:
+            self.spill.delete_chat(chat_id)
 
     def get_all_chats(self) -> List[Chat]:
-        return list(self.chats.values())
+        return self._all_chats(self.spill.get_all_chats() if self.spill is not None else [])
     
     def clear_all_chats(self) -> None:
-        self.chats.clear()
-        self.metadata.clear()
+        self._clear_memory()
+        if self.spill is not None:
+            self.spill.clear_all_chats()
 
     def clear_chat_history(self, chat_id: str) -> None:
-        self.chats[chat_id].clear_history()
+        chat = self.get_chat(chat_id)
+        if chat is None:
+            raise KeyError(chat_id)
+        chat.clear_history()
 
     async def save_chat_async(self, chat: Chat) -> None:
-        self.chats[chat.chat_id] = chat
-        self.metadata[chat.chat_id].update({
-            'message_count': len(chat.get_messages()),
-            'last_updated': datetime.utcnow().isoformat()
-        })
+        self._put(chat)
+        self._update_metadata(chat)
+        await self._evict_async(keep=chat.chat_id)
 
     async def get_chat_async(self, chat_id: str) -> Chat:
-        return self.chats.get(chat_id)
+        chat = self._resident(chat_id)
+        if chat is None and self.spill is not None:
+            spilled = await self.spill.get_chat_async(chat_id)
+            if spilled is not None:
+                chat = self._adopt(self, spilled)
+                await self._evict_async(keep=chat_id)
+        return chat
     
     async def get_or_create_chat_async(self, database: DatabaseInterface, chat_id: str) -> Chat:
-        if chat_id not in self.chats:
-            self.chats[chat_id] = Chat(database, chat_id)
-            self.metadata[chat_id] = {}
-        return self.chats[chat_id]
+        chat = self._resident(chat_id)
+        if chat is None:
+            spilled = await self.spill.get_chat_async(chat_id) if self.spill is not None else None
+            chat = self._adopt(database, spilled) if spilled is not None else self._create(database, chat_id)
+            await self._evict_async(keep=chat_id)
+        return chat
     
     async def delete_chat_async(self, chat_id: str) -> None:
-        self.chats.pop(chat_id, None)
-        self.metadata.pop(chat_id, None)
+        self._remove(chat_id)
+        if self.spill is not None:
+            await self.spill.delete_chat_async(chat_id)
 
     async def get_all_chats_async(self) -> List[Chat]:
-        return list(self.chats.values())
+        return self._all_chats(await self.spill.get_all_chats_async() if self.spill is not None else [])
     
     async def clear_all_chats_async(self) -> None:
-        self.chats.clear()
-        self.metadata.clear()
+        self._clear_memory()
+        if self.spill is not None:
+            await self.spill.clear_all_chats_async()
 
     async def clear_chat_history_async(self, chat_id: str) -> None:
-        self.chats[chat_id].clear_history()
+        chat = await self.get_chat_async(chat_id)
+        if chat is None:
+            raise KeyError(chat_id)
+        chat.clear_history()
+
+
+class SQLiteDatabase(DatabaseInterface):
+    """Chats in a SQLite file, usable from sync and async code alike.
+
+    Messages are stored one row each in a table keyed by (chat_id, seq), so
+    a turn appends a row instead of rewriting the chat. All writes go
+    through one writer thread that commits whatever has queued up in a
+    single transaction (group commit); callers wait for their commit, so a
+    read after a write always sees it. Reads use per-thread connections and
+    run next to the writer thanks to WAL. Tables are created on first use.
+
+    synchronous is SQLite's PRAGMA synchronous. With the default NORMAL a
+    commit costs little and group commit gains little; with FULL every
+    commit is synced to disk, and sharing that sync is what group commit is for.
+    """
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS chats ("
+        "chat_id TEXT PRIMARY KEY, created_at TEXT, metadata TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS messages ("
+        "chat_id TEXT NOT NULL, seq INTEGER NOT NULL, id TEXT NOT NULL, role TEXT NOT NULL, "
+        "content TEXT NOT NULL, image TEXT, timestamp TEXT, "
+        "PRIMARY KEY (chat_id, seq)) WITHOUT ROWID",
+    )
+
+    # Constant statement texts, so sqlite3 compiles each of them once per connection
+    _upsert_chat = (
+        "INSERT INTO chats (chat_id, created_at, metadata) VALUES (?, ?, ?) "
+        "ON CONFLICT (chat_id) DO UPDATE SET metadata = excluded.metadata"
+    )
+    _insert_message = (
+        "INSERT OR REPLACE INTO messages (chat_id, seq, id, role, content, image, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)"
+    )
+    _trim_messages = (
+        "DELETE FROM messages WHERE chat_id = ? "
+        "AND seq <= (SELECT MAX(seq) FROM messages WHERE chat_id = ?) - ?"
+    )
+    _select_chat = "SELECT created_at, metadata FROM chats WHERE chat_id = ?"
+    _select_messages = (
+        "SELECT id, role, content, image, timestamp FROM messages WHERE chat_id = ? ORDER BY seq"
+    )
+
+    def __init__(self, path: str = "chats.db",
+                 max_batch: int = 256,
+                 commit_interval: float = 0.0,
+                 synchronous: str = "NORMAL"):
+        super().__init__(DatabaseType.Universal)
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Unknown synchronous mode: {synchronous}")
+        self.path = path
+        self.synchronous = synchronous.upper()
+        self.max_batch = max_batch
+        # Extra time the writer waits for more writes to join a transaction
+        self.commit_interval = commit_interval
+        self._queue: "queue.Queue[Optional[Tuple[Callable, Future]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._closed = False
+        # Group commit statistics: transactions committed and writes they carried
+        self.batches = 0
+        self.batched_writes = 0
+
+    # Connections
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None,
+                                     check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL and NORMAL a commit survives a crash of the process, only a power loss may undo the last ones
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def _ensure_schema(self) -> None:
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            if self._closed:
+                raise RuntimeError("Database is closed")
+            connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            try:
+                connection.execute("PRAGMA journal_mode=WAL")
+                for statement in self._schema:
+                    connection.execute(statement)
+            finally:
+                connection.close()
+            self._writer = threading.Thread(target=self._write_loop, name="blackbox-sqlite-writer", daemon=True)
+            self._writer.start()
+            self._initialized = True
+
+    def _reader(self) -> sqlite3.Connection:
+        self._ensure_schema()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def close(self) -> None:
+        """Commit pending writes and close all connections."""
+        with self._lock:
+            self._closed = True
+            writer = self._writer
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+    # Group commit
 
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            if self.commit_interval:
+                time.sleep(self.commit_interval)
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(connection, batch)
+            self.batches += 1
+            self.batched_writes += len(batch)
+            if stop:
+                return
 
+    def _commit(self, connection: sqlite3.Connection, batch: List[Tuple[Callable, Future]]) -> None:
+        results = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    # Nobody waits for a cancelled write anymore
+                    continue
+                # A failing write is rolled back alone, the rest of the batch still commits
+                connection.execute("SAVEPOINT operation")
+                try:
+                    results.append((future, operation(connection), None))
+                    connection.execute("RELEASE operation")
+                except Exception as e:
+                    connection.execute("ROLLBACK TO operation")
+                    connection.execute("RELEASE operation")
+                    results.append((future, None, e))
+            connection.execute("COMMIT")
+        except Exception as e:
+            try:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+            except sqlite3.Error:
+                # The writer must outlive a broken transaction, or every later write would hang
+                pass
+            # Includes writes never started, e.g. when BEGIN itself timed out on a locked database
+            for _, future in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
 
+    def _submit(self, operation: Callable[[sqlite3.Connection], Any]) -> Future:
+        self._ensure_schema()
+        if self._closed:
+            raise RuntimeError("Database is closed")
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future
 
+    def _write(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        return self._submit(operation).result()
+
+    async def _write_async(self, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.wrap_future(self._submit(operation))
+
+    async def _read_async(self, function: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    # Operations, run on the writer connection
+
+    @classmethod
+    def _message_rows(cls, chat: Chat) -> List[Tuple]:
+        # message_count only grows, so the newest message always has seq == message_count
+        first_seq = chat.message_count - len(chat.messages) + 1
+        return [cls._message_row(chat, first_seq + index, message) for index, message in enumerate(chat.messages)]
+
+    @staticmethod
+    def _message_row(chat: Chat, seq: int, message: Message) -> Tuple:
+        return (chat.chat_id, seq, message.id, message.role, message.content, message.image, message.timestamp)
+
+    def _save_operation(self, chat: Chat) -> Callable[[sqlite3.Connection], None]:
+        chat_row = (chat.chat_id, chat.created_at, json.dumps(chat.metadata))
+        message_rows = self._message_rows(chat)
+
+        def operation(connection: sqlite3.Connection) -> None:
+            connection.execute(self._upsert_chat, chat_row)
+            connection.execute("DELETE FROM messages WHERE chat_id = ?", (chat.chat_id,))
+            connection.executemany(self._insert_message, message_rows)
+        return operation
+
+    def _append_operation(self, chat: Chat, messages: List[Message]) -> Callable[[sqlite3.Connection], None]:
+        chat_row = (chat.chat_id, chat.created_at, json.dumps(chat.metadata))
+        # Taken from the messages' positions, so appends written later (e.g. buffered) still get their own seq.
+        # Messages already pushed out of the chat are left out, a trim would delete them anyway
+        first_seq = chat.message_count - len(chat.messages) + 1
+        wanted = {id(message) for message in messages}
+        message_rows = [
+            self._message_row(chat, first_seq + index, chat_message)
+            for index, chat_message in enumerate(chat.messages) if id(chat_message) in wanted
+        ]
+
+        def operation(connection: sqlite3.Connection) -> None:
+            connection.execute(self._upsert_chat, chat_row)
+            connection.executemany(self._insert_message, message_rows)
+        return operation
+
+    def _trim_operation(self, chat_id: str, count: int) -> Callable[[sqlite3.Connection], None]:
+        return lambda connection: connection.execute(self._trim_messages, (chat_id, chat_id, count))
+
+    def _create_operation(self, chat: Chat) -> Callable[[sqlite3.Connection], None]:
+        chat_row = (chat.chat_id, chat.created_at, json.dumps(chat.metadata))
+        return lambda connection: connection.execute(
+            "INSERT OR IGNORE INTO chats (chat_id, created_at, metadata) VALUES (?, ?, ?)", chat_row
+        )
+
+    @staticmethod
+    def _delete_operation(chat_id: str) -> Callable[[sqlite3.Connection], None]:
+        def operation(connection: sqlite3.Connection) -> None:
+            connection.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            connection.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+        return operation
+
+    @staticmethod
+    def _clear_all_operation(connection: sqlite3.Connection) -> None:
+        connection.execute("DELETE FROM messages")
+        connection.execute("DELETE FROM chats")
+
+    # Reads
+
+    def _load_chat(self, database: DatabaseInterface, chat_id: str) -> Optional[Chat]:
+        connection = self._reader()
+        row = connection.execute(self._select_chat, (chat_id,)).fetchone()
+        if row is None:
+            return None
+        chat = Chat(database, chat_id)
+        chat.created_at = row[0]
+        chat.metadata = json.loads(row[1])
+        for message_id, role, content, image, timestamp in connection.execute(self._select_messages, (chat_id,)):
+            chat.messages.append(Message(role=role, content=content, image=image, id=message_id, timestamp=timestamp))
+        return chat
+
+    def _load_all_chats(self) -> List[Chat]:
+        chat_ids = [row[0] for row in self._reader().execute("SELECT chat_id FROM chats ORDER BY created_at")]
+        return [chat for chat in (self._load_chat(self, chat_id) for chat_id in chat_ids) if chat is not None]
+
+    # DatabaseInterface
+
+    def save_chat(self, chat: Chat) -> None:
+        self._write(self._save_operation(chat))
+
+    def append_message(self, chat: Chat, message: Message) -> None:
+        self._write(self._append_operation(chat, [message]))
+
+    def append_messages(self, chat: Chat, messages: List[Message]) -> None:
+        self._write(self._append_operation(chat, messages))
+
+    def trim_to(self, chat_id: str, count: int) -> None:
+        # Not waited for: loading a chat keeps only its newest messages anyway,
+        # and the writer runs the trim after the append that caused it
+        self._submit(self._trim_operation(chat_id, count))
+
+    def get_chat(self, chat_id: str) -> Chat:
+        return self._load_chat(self, chat_id)
+
+    def get_or_create_chat(self, database: DatabaseInterface, chat_id: str) -> Chat:
+        chat = self._load_chat(database, chat_id)
+        if chat is None:
+            chat = Chat(database, chat_id)
+            self._write(self._create_operation(chat))
+        return chat
+
+    def delete_chat(self, chat_id: str) -> None:
+        self._write(self._delete_operation(chat_id))
+
+    def get_all_chats(self) -> List[Chat]:
+        return self._load_all_chats()
+
+    def clear_all_chats(self) -> None:
+        self._write(self._clear_all_operation)
+
+    def clear_chat_history(self, chat_id: str) -> None:
+        chat = self._load_chat(self, chat_id)
+        if chat is not None:
+            chat.clear_history()
+
+    async def save_chat_async(self, chat: Chat) -> None:
+        await self._write_async(self._save_operation(chat))
 
+    async def append_message_async(self, chat: Chat, message: Message) -> None:
+        await self._write_async(self._append_operation(chat, [message]))
+
+    async def append_messages_async(self, chat: Chat, messages: List[Message]) -> None:
+        await self._write_async(self._append_operation(chat, messages))
+
+    async def trim_to_async(self, chat_id: str, count: int) -> None:
+        self._submit(self._trim_operation(chat_id, count))
+
+    async def get_chat_async(self, chat_id: str) -> Chat:
+        return await self._read_async(self._load_chat, self, chat_id)
+
+    async def get_or_create_chat_async(self, database: DatabaseInterface, chat_id: str) -> Chat:
+        chat = await self._read_async(self._load_chat, database, chat_id)
+        if chat is None:
+            chat = Chat(database, chat_id)
+            await self._write_async(self._create_operation(chat))
+        return chat
+
+    async def delete_chat_async(self, chat_id: str) -> None:
+        await self._write_async(self._delete_operation(chat_id))
+
+    async def get_all_chats_async(self) -> List[Chat]:
+        return await self._read_async(self._load_all_chats)
+
+    async def clear_all_chats_async(self) -> None:
+        await self._write_async(self._clear_all_operation)
+
+    async def clear_chat_history_async(self, chat_id: str) -> None:
+        chat = await self.get_chat_async(chat_id)
+        if chat is not None:
+            await chat.clear_history_async()
+
+
+class _PendingChat:
+    """Writes of one chat waiting in a BufferedDatabase."""
+
+    def __init__(self, chat: Optional[Chat]):
+        self.chat = chat
+        self.full = False
+        self.messages: List[Message] = []
+        self.trim: Optional[int] = None
+
+
+class BufferedDatabase(DatabaseInterface):
+    """Write-behind layer over any database.
+
+    Saves and appended messages are only recorded and written to the wrapped
+    database later, in batches: once max_pending chats are dirty, or
+    flush_interval seconds after the first buffered write, and on flush()
+    (which the client calls when it is closed). Repeated saves of a chat
+    coalesce into one. Reads see buffered chats first, so a chat just
+    written is always read back as written.
+    """
+
+    def __init__(self, database: DatabaseInterface, max_pending: int = 64, flush_interval: float = 1.0):
+        super().__init__(database.database_type)
+        self.database = database
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, _PendingChat] = {}
+        # Taken out of _pending by a running flush but not written yet
+        self._flushing: Dict[str, _PendingChat] = {}
+        self._lock = threading.Lock()
+        # Flushes run one at a time, whether from threads or event loops
+        self._flush_lock = ChatLock()
+        self._timer: Optional[threading.Timer] = None
+        self._timer_task: Optional[asyncio.Task] = None
+
+    @property
+    def persistent(self) -> bool:
+        return self.database.persistent
+
+    # Buffering
+
+    def _entry(self, chat_id: str, chat: Optional[Chat]) -> _PendingChat:
+        entry = self._pending.get(chat_id)
+        if entry is None:
+            entry = self._pending[chat_id] = _PendingChat(chat)
+        elif chat is not None:
+            entry.chat = chat
+        return entry
+
+    def _record_save(self, chat: Chat) -> bool:
+        with self._lock:
+            entry = self._entry(chat.chat_id, chat)
+            entry.full = True
+            entry.messages.clear()
+            entry.trim = None
+            return len(self._pending) >= self.max_pending
+
+    def _record_append(self, chat: Chat, message: Message) -> bool:
+        with self._lock:
+            entry = self._entry(chat.chat_id, chat)
+            if not entry.full:
+                entry.messages.append(message)
+            return len(self._pending) >= self.max_pending
+
+    def _record_trim(self, chat_id: str, count: int) -> None:
+        with self._lock:
+            entry = self._entry(chat_id, None)
+            if not entry.full:
+                entry.trim = count if entry.trim is None else min(entry.trim, count)
+
+    def _buffered(self, chat_id: str) -> Optional[Chat]:
+        with self._lock:
+            entry = self._pending.get(chat_id) or self._flushing.get(chat_id)
+            return entry.chat if entry is not None else None
+
+    def _forget(self, chat_id: Optional[str] = None) -> None:
+        with self._lock:
+            if chat_id is None:
+                self._pending.clear()
+            else:
+                self._pending.pop(chat_id, None)
+
+    def _take(self) -> Dict[str, _PendingChat]:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            return batch
+
+    def _restore(self, batch: Dict[str, _PendingChat]) -> None:
+        """Put back a batch that failed to flush, under anything buffered since."""
+        with self._lock:
+            for chat_id, entry in batch.items():
+                newer = self._pending.get(chat_id)
+                if newer is None:
+                    self._pending[chat_id] = entry
+                elif not newer.full:
+                    newer.full = entry.full
+                    newer.messages[:0] = entry.messages
+                    if newer.chat is None:
+                        newer.chat = entry.chat
+            self._flushing = {}
+
+    # Flushing
+
+    def _schedule(self) -> None:
+        with self._lock:
+            if self._timer is not None or not self._pending:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            # Kept buffered, the next timer retries
+            self._schedule()
+
+    def _schedule_async(self) -> None:
+        task = self._timer_task
+        if task is not None and not task.done():
+            return
+        self._timer_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush_async()
+        except Exception:
+            self._timer_task = None
+            self._schedule_async()
+
+    def flush(self) -> None:
+        self._flush_lock.acquire_sync()
+        try:
+            batch = self._take()
+            try:
+                for chat_id, entry in batch.items():
+                    if entry.full:
+                        self.database.save_chat(entry.chat)
+                    else:
+                        if entry.messages:
+                            self.database.append_messages(entry.chat, entry.messages)
+                        if entry.trim is not None:
+                            self.database.trim_to(chat_id, entry.trim)
+                    # Written, a failure further on must not write it again
+                    entry.full, entry.messages, entry.trim = False, [], None
+            except BaseException:
+                self._restore(batch)
+                raise
+            with self._lock:
+                self._flushing = {}
+        finally:
+            self._flush_lock.release()
+
+    async def flush_async(self) -> None:
+        await self._flush_lock.acquire()
+        try:
+            batch = self._take()
+            try:
+                # Chats are written concurrently, a group-committing backend then needs few transactions
+                results = await asyncio.gather(
+                    *[self._flush_entry_async(chat_id, entry) for chat_id, entry in batch.items()],
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+            except BaseException:
+                self._restore(batch)
+                raise
+            with self._lock:
+                self._flushing = {}
+        finally:
+            self._flush_lock.release()
+
+    async def _flush_entry_async(self, chat_id: str, entry: _PendingChat) -> None:
+        if entry.full:
+            await self.database.save_chat_async(entry.chat)
+        else:
+            if entry.messages:
+                # One write per chat, however many turns were buffered
+                await self.database.append_messages_async(entry.chat, entry.messages)
+            if entry.trim is not None:
+                await self.database.trim_to_async(chat_id, entry.trim)
+        entry.full, entry.messages, entry.trim = False, [], None
+
+    # DatabaseInterface
+
+    def save_chat(self, chat: Chat) -> None:
+        if self._record_save(chat):
+            self.flush()
+        else:
+            self._schedule()
+
+    def append_message(self, chat: Chat, message: Message) -> None:
+        if self._record_append(chat, message):
+            self.flush()
+        else:
+            self._schedule()
+
+    def trim_to(self, chat_id: str, count: int) -> None:
+        self._record_trim(chat_id, count)
+
+    def get_chat(self, chat_id: str) -> Chat:
+        return self._buffered(chat_id) or self.database.get_chat(chat_id)
+
+    def get_or_create_chat(self, database: DatabaseInterface, chat_id: str) -> Chat:
+        return self._buffered(chat_id) or self.database.get_or_create_chat(database, chat_id)
+
+    def delete_chat(self, chat_id: str) -> None:
+        # Under the flush lock, so a running flush can't write the chat back afterwards
+        self._flush_lock.acquire_sync()
+        try:
+            self._forget(chat_id)
+            self.database.delete_chat(chat_id)
+        finally:
+            self._flush_lock.release()
+
+    def get_all_chats(self) -> List[Chat]:
+        self.flush()
+        return self.database.get_all_chats()
+
+    def clear_all_chats(self) -> None:
+        self._flush_lock.acquire_sync()
+        try:
+            self._forget()
+            self.database.clear_all_chats()
+        finally:
+            self._flush_lock.release()
+
+    def clear_chat_history(self, chat_id: str) -> None:
+        chat = self._buffered(chat_id)
+        if chat is None:
+            self.database.clear_chat_history(chat_id)
+        else:
+            chat.clear_history()
+
+    async def save_chat_async(self, chat: Chat) -> None:
+        if self._record_save(chat):
+            await self.flush_async()
+        else:
+            self._schedule_async()
+
+    async def append_message_async(self, chat: Chat, message: Message) -> None:
+        if self._record_append(chat, message):
+            await self.flush_async()
+        else:
+            self._schedule_async()
+
+    async def trim_to_async(self, chat_id: str, count: int) -> None:
+        self._record_trim(chat_id, count)
+
+    async def get_chat_async(self, chat_id: str) -> Chat:
+        return self._buffered(chat_id) or await self.database.get_chat_async(chat_id)
+
+    async def get_or_create_chat_async(self, database: DatabaseInterface, chat_id: str) -> Chat:
+        return self._buffered(chat_id) or await self.database.get_or_create_chat_async(database, chat_id)
+
+    async def delete_chat_async(self, chat_id: str) -> None:
+        await self._flush_lock.acquire()
+        try:
+            self._forget(chat_id)
+            await self.database.delete_chat_async(chat_id)
+        finally:
+            self._flush_lock.release()
+
+    async def get_all_chats_async(self) -> List[Chat]:
+        await self.flush_async()
+        return await self.database.get_all_chats_async()
+
+    async def clear_all_chats_async(self) -> None:
+        await self._flush_lock.acquire()
+        try:
+            self._forget()
+            await self.database.clear_all_chats_async()
+        finally:
+            self._flush_lock.release()
+
+    async def clear_chat_history_async(self, chat_id: str) -> None:
+        chat = self._buffered(chat_id)
+        if chat is None:
+            await self.database.clear_chat_history_async(chat_id)
+        else:
+            await chat.clear_history_async()
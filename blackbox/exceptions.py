@@ -7,3 +7,27 @@ class DatabaseTypeError(Exception):
 
 class APIRequestError(Exception):
     pass
+
+class APITimeoutError(APIRequestError):
+    pass
+
+class ConnectTimeoutError(APITimeoutError):
+    pass
+
+class IncompleteResponseError(APIRequestError):
+    pass
+
+class APIStatusError(APIRequestError):
+    def __init__(self, message: str, status: int, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class ValidationRejectedError(APIStatusError):
+    pass
+
+class AccountUnavailableError(APIRequestError):
+    pass
+
+class CircuitOpenError(APIRequestError):
+    pass
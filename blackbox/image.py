@@ -1,10 +1,99 @@
+import asyncio
 import base64
+import hashlib
+import inspect
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from PIL import Image as PILImage, ImageOps
 from PIL.Image import Image
 from io import BytesIO
-from typing import Union, IO
+from typing import Any, Optional, Tuple, Union, IO
+
+from blackbox.blobs import Blob, BlobStore, MemoryBlobStore
 
 ImageType = Union[str, bytes, IO, Image, None]
 
+# Below this size hashing and encoding on the event loop is cheaper than an executor hop
+INLINE_LIMIT = 64 * 1024
+
+
+async def run_blocking(func, *args):
+    """Run blocking image work in the loop's default executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def preprocess_image(data: bytes, max_edge: Optional[int], format: str, quality: int, strip_exif: bool) -> bytes:
+    """Downscale and re-encode an image; module level so process pools can pickle it."""
+    with PILImage.open(BytesIO(data)) as image:
+        # Анимацию не трогаем, перекодирование оставило бы только первый кадр
+        if getattr(image, "n_frames", 1) > 1:
+            return data
+        has_exif = bool(image.info.get("exif"))
+        resize = max_edge is not None and max(image.size) > max_edge
+
+        if resize and image.format == "JPEG":
+            # Let the JPEG decoder skip detail that the downscale would throw away anyway
+            image.draft("RGB", (max_edge, max_edge))
+        if strip_exif:
+            # EXIF orientation is lost with the metadata, so bake it into the pixels
+            image = ImageOps.exif_transpose(image)
+        if resize:
+            image.thumbnail((max_edge, max_edge), PILImage.LANCZOS)
+        if format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGBA")
+            background = PILImage.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+
+        options = {"quality": quality}
+        if format == "JPEG":
+            options["optimize"] = True
+        if not strip_exif and has_exif:
+            options["exif"] = image.info["exif"]
+
+        output = BytesIO()
+        image.save(output, format=format, **options)
+        processed = output.getvalue()
+
+    # Re-encoding a small, clean image may only make it bigger
+    if not resize and not (strip_exif and has_exif) and len(processed) >= len(data):
+        return data
+    return processed
+
+
+@dataclass
+class ImagePreprocessor:
+    """Shrinks images before they are base64-encoded into the payload.
+
+    Images larger than max_edge are downscaled, everything is re-encoded to
+    format (JPEG or WEBP) at quality, and EXIF is dropped unless strip_exif is
+    False. The async path runs in executor (the loop's default thread pool if
+    None); a ProcessPoolExecutor works too.
+    """
+    max_edge: Optional[int] = 1568
+    format: str = "JPEG"
+    quality: int = 85
+    strip_exif: bool = True
+    executor: Optional[Executor] = None
+
+    def __post_init__(self):
+        self.format = self.format.upper()
+        if self.format not in ("JPEG", "WEBP"):
+            raise ValueError(f"Unsupported preprocessing format: {self.format}")
+
+    def process(self, data: bytes) -> bytes:
+        return preprocess_image(data, self.max_edge, self.format, self.quality, self.strip_exif)
+
+    async def process_async(self, data: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, preprocess_image, data,
+                                          self.max_edge, self.format, self.quality, self.strip_exif)
+
+
 class ImageTool:
     @staticmethod
     def is_accepted_format(binary_data: bytes) -> str:
@@ -62,23 +151,238 @@ class ImageTool:
             raise ValueError(f"Failed to convert image to bytes: {str(e)}")
 
     @staticmethod
-    def image_to_base64(image: ImageType) -> str:
+    def to_buffer(image: ImageType) -> Blob:
+        """Like :meth:`to_bytes`, but files given by path are memory-mapped instead of read."""
+        if isinstance(image, str) and not image.startswith('data:'):
+            try:
+                with open(image, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size:
+                        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except OSError as e:
+                raise ValueError(f"Failed to convert image to bytes: {str(e)}")
+        return ImageTool.to_bytes(image)
+
+    @staticmethod
+    def image_to_base64(image: ImageType, preprocessor: Optional[ImagePreprocessor] = None) -> str:
         try:
-            if isinstance(image, str) and image.startswith('data:'):
+            if isinstance(image, str) and image.startswith('data:') and preprocessor is None:
                 return image
             
-            data = ImageTool.to_bytes(image)
-        
-            mime_type = ImageTool.is_accepted_format(data)
-        
-            base64_data = base64.b64encode(data).decode('utf-8')
-        
-            return f"data:{mime_type};base64,{base64_data}"
+            data = ImageTool.to_buffer(image)
+            if preprocessor is not None:
+                data = preprocessor.process(data)
+
+            return ImageTool.bytes_to_base64(data)
         
         except Exception as e:
             raise ValueError(f"Failed to convert image to base64: {str(e)}")
 
+    @staticmethod
+    def is_async_file(image: Any) -> bool:
+        return inspect.iscoroutinefunction(getattr(image, "read", None))
+
+    @staticmethod
+    async def to_buffer_async(image: Any) -> Blob:
+        """Like :meth:`to_buffer` without blocking the event loop.
+
+        Also accepts async file-like objects (aiofiles, aiohttp streams and
+        anything else with ``async def read(size)``).
+        """
+        if isinstance(image, bytes):
+            return image
+        if not ImageTool.is_async_file(image):
+            # Paths, sync files, PIL images and data URIs all block, so hand them to a thread
+            return await run_blocking(ImageTool.to_buffer, image)
+        try:
+            chunks = []
+            while True:
+                chunk = await image.read(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            seek = getattr(image, "seek", None)
+            if seek is not None:
+                try:
+                    result = seek(0)
+                    if inspect.isawaitable(result):
+                        await result
+                except (OSError, IOError):
+                    pass
+            return b''.join(chunks)
+
+        except Exception as e:
+            raise ValueError(f"Failed to convert image to bytes: {str(e)}")
+
+    @staticmethod
+    async def image_to_base64_async(image: Any, preprocessor: Optional[ImagePreprocessor] = None) -> str:
+        """Like :meth:`image_to_base64`, with file reads, PIL work and encoding off the event loop."""
+        try:
+            if isinstance(image, str) and image.startswith('data:') and preprocessor is None:
+                return image
+
+            data = await ImageTool.to_buffer_async(image)
+            if preprocessor is not None:
+                data = await preprocessor.process_async(data)
+
+            if len(data) <= INLINE_LIMIT:
+                return ImageTool.bytes_to_base64(data)
+            return await run_blocking(ImageTool.bytes_to_base64, data)
+
+        except Exception as e:
+            raise ValueError(f"Failed to convert image to base64: {str(e)}")
+
+    @staticmethod
+    def data_uri_prefix(data: Blob) -> str:
+        return f"data:{ImageTool.is_accepted_format(bytes(data[:16]))};base64,"
+
+    @staticmethod
+    def bytes_to_base64(data: Blob) -> str:
+        prefix = ImageTool.data_uri_prefix(data)
+
+        encoded = base64.b64encode(data)
+        # Drop each intermediate as soon as possible, a data URI may be tens of megabytes
+        base64_data = encoded.decode('ascii')
+        del encoded
+
+        return prefix + base64_data
+
     @staticmethod
     def extract_data_uri(data_uri: str) -> bytes:
         data = data_uri.split(",")[-1]
-        return base64.b64decode(data)
\ No newline at end of file
+        return base64.b64decode(data)
+
+
+class ImageStore:
+    """Keeps chat images once per content in a blob store.
+
+    Messages hold only a reference ("blob:<sha256>"); the data URI is built
+    when a payload is sent. Data URIs of images up to memoize_limit bytes are
+    memoized so identical images in different chats are encoded once; larger
+    ones are base64-encoded chunk by chunk into each request body instead of
+    being held in memory. Preprocessing results are memoized by the digest of
+    the source image as well.
+
+    The default MemoryBlobStore is bounded and lost on exit; with a database
+    that persists chats, pass a DiskBlobStore so their references stay valid.
+    """
+
+    REF_PREFIX = "blob:"
+
+    def __init__(self, blobs: Optional[BlobStore] = None,
+                 max_cached_bytes: int = 64 * 1024 * 1024,
+                 max_sources: int = 4096,
+                 memoize_limit: int = 2 * 1024 * 1024):
+        self.blobs = blobs if blobs is not None else MemoryBlobStore()
+        self.max_cached_bytes = max_cached_bytes
+        self.memoize_limit = memoize_limit
+        self.max_sources = max_sources
+        # ref -> data URI, least recently used first
+        self._uris: "OrderedDict[str, str]" = OrderedDict()
+        self._uri_bytes = 0
+        # (source digest, preprocessing settings) -> ref
+        self._sources: "OrderedDict[Tuple[str, Any], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_ref(cls, value: Any) -> bool:
+        return isinstance(value, str) and value.startswith(cls.REF_PREFIX)
+
+    @staticmethod
+    def _settings(preprocessor: Optional[ImagePreprocessor]) -> Any:
+        if preprocessor is None:
+            return None
+        return (preprocessor.max_edge, preprocessor.format, preprocessor.quality, preprocessor.strip_exif)
+
+    def _lookup_source(self, data: Blob, preprocessor: Optional[ImagePreprocessor]) -> Tuple[Tuple[str, Any], Optional[str]]:
+        source = (hashlib.sha256(data).hexdigest(), self._settings(preprocessor))
+        with self._lock:
+            ref = self._sources.get(source)
+            if ref is not None:
+                self._sources.move_to_end(source)
+        if ref is not None and ref[len(self.REF_PREFIX):] not in self.blobs:
+            ref = None
+        return source, ref
+
+    def _store(self, source: Tuple[str, Any], data: Blob) -> str:
+        ImageTool.is_accepted_format(bytes(data[:16]))
+        ref = self.REF_PREFIX + self.blobs.put(data)
+        with self._lock:
+            self._sources[source] = ref
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return ref
+
+    def add(self, image: ImageType, preprocessor: Optional[ImagePreprocessor] = None) -> str:
+        """Store an image and return its reference."""
+        if self.is_ref(image):
+            return image
+        try:
+            data = ImageTool.to_buffer(image)
+            source, ref = self._lookup_source(data, preprocessor)
+            if ref is not None:
+                return ref
+            if preprocessor is not None:
+                data = preprocessor.process(data)
+            return self._store(source, data)
+
+        except Exception as e:
+            raise ValueError(f"Failed to store image: {str(e)}")
+
+    async def add_async(self, image: ImageType, preprocessor: Optional[ImagePreprocessor] = None) -> str:
+        """Like :meth:`add`, with reading, hashing, preprocessing and storing off the event loop."""
+        if self.is_ref(image):
+            return image
+        try:
+            data = await ImageTool.to_buffer_async(image)
+            if len(data) <= INLINE_LIMIT:
+                source, ref = self._lookup_source(data, preprocessor)
+            else:
+                source, ref = await run_blocking(self._lookup_source, data, preprocessor)
+            if ref is not None:
+                return ref
+            if preprocessor is not None:
+                data = await preprocessor.process_async(data)
+            return await run_blocking(self._store, source, data)
+
+        except Exception as e:
+            raise ValueError(f"Failed to store image: {str(e)}")
+
+    def data_uri(self, ref: str) -> str:
+        """Data URI of a stored image; values that are not references pass through."""
+        if not self.is_ref(ref):
+            return ref
+        with self._lock:
+            uri = self._uris.get(ref)
+            if uri is not None:
+                self._uris.move_to_end(ref)
+                return uri
+
+        uri = ImageTool.bytes_to_base64(self.blob(ref))
+        if len(uri) <= self.max_cached_bytes:
+            with self._lock:
+                if ref not in self._uris:
+                    self._uris[ref] = uri
+                    self._uri_bytes += len(uri)
+                while self._uri_bytes > self.max_cached_bytes:
+                    _, evicted = self._uris.popitem(last=False)
+                    self._uri_bytes -= len(evicted)
+        return uri
+
+    def blob(self, ref: str) -> Blob:
+        return self.blobs.get(ref[len(self.REF_PREFIX):])
+
+    @staticmethod
+    def uri_prefix(blob: Blob) -> str:
+        return ImageTool.data_uri_prefix(blob)
+
+    def encoded(self, ref: str) -> Optional[str]:
+        """Memoized data URI of a stored image, None if it is too large to be kept encoded."""
+        with self._lock:
+            uri = self._uris.get(ref)
+            if uri is not None:
+                self._uris.move_to_end(ref)
+                return uri
+        blob = self.blob(ref)
+        if 4 * ((len(blob) + 2) // 3) > self.memoize_limit:
+            return None
+        return self.data_uri(ref)
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+
+class ChatLock:
+    """FIFO lock usable from any event loop and from plain threads.
+
+    The sync API runs on the client's loop thread while async callers use
+    their own loop, so an asyncio.Lock (bound to one loop) is not enough.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locked = False
+        self._waiters: Deque[Future] = deque()
+
+    def _enqueue(self) -> Future:
+        waiter: Future = Future()
+        with self._guard:
+            if not self._locked:
+                self._locked = True
+                waiter.set_result(None)
+            else:
+                self._waiters.append(waiter)
+        return waiter
+
+    async def acquire(self) -> None:
+        waiter = self._enqueue()
+        try:
+            await asyncio.wrap_future(waiter)
+        except asyncio.CancelledError:
+            with self._guard:
+                # Fails only if the lock was already handed over to this waiter
+                owned = not waiter.cancel()
+            if owned:
+                self.release()
+            raise
+
+    def acquire_sync(self) -> None:
+        self._enqueue().result()
+
+    def release(self) -> None:
+        with self._guard:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                # Skip waiters that gave up; ownership passes straight to the next one
+                if waiter.set_running_or_notify_cancel():
+                    waiter.set_result(None)
+                    return
+            self._locked = False
+
+
+class ChatLocks:
+    """Per-chat locks: requests on one chat run one at a time, other chats run freely."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        # chat_id -> (lock, number of holders and waiters)
+        self._locks: Dict[str, Tuple[ChatLock, int]] = {}
+
+    def _checkout(self, chat_id: str) -> ChatLock:
+        with self._guard:
+            lock, users = self._locks.get(chat_id, (None, 0))
+            if lock is None:
+                lock = ChatLock()
+            self._locks[chat_id] = (lock, users + 1)
+            return lock
+
+    def _checkin(self, chat_id: str) -> None:
+        with self._guard:
+            lock, users = self._locks[chat_id]
+            if users <= 1:
+                del self._locks[chat_id]
+            else:
+                self._locks[chat_id] = (lock, users - 1)
+
+    @asynccontextmanager
+    async def hold(self, chat_id: Optional[str]) -> AsyncIterator[None]:
+        """Hold the lock of a chat; chat_id None means a private chat that needs none."""
+        if chat_id is None:
+            yield
+            return
+        lock = self._checkout(chat_id)
+        try:
+            await lock.acquire()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._checkin(chat_id)
+
+    @contextmanager
+    def hold_sync(self, chat_id: Optional[str]) -> Iterator[None]:
+        if chat_id is None:
+            yield
+            return
+        lock = self._checkout(chat_id)
+        try:
+            lock.acquire_sync()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._checkin(chat_id)
@@ -1,8 +1,10 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Union
 from dataclasses import dataclass
+import random
+import time
 import uuid
 from collections import deque
-from datetime import datetime
+from datetime import datetime, timedelta
 from blackbox.exceptions import DatabaseTypeError
 from blackbox.types import DatabaseInterface, DatabaseType
 
@@ -40,23 +42,130 @@ class Model():
         }
     
 @dataclass
+class CompletionRequest():
+    message: str
+    model: Model
+    max_tokens: int
+    agent: Optional[AgentMode] = None
+    image: Optional[Any] = None
+    chat_id: Optional[str] = None
+
+    @classmethod
+    def from_value(cls, value: Union["CompletionRequest", Dict[str, Any]]) -> "CompletionRequest":
+        if isinstance(value, cls):
+            return value
+        return cls(**value)
+
+@dataclass
+class BatchResult():
+    index: int
+    # The item as given when it could not be turned into a CompletionRequest
+    request: Union[CompletionRequest, Dict[str, Any]]
+    response: Optional[str] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_micros(value: Union[str, int, None]) -> Union[str, int]:
+    """Timestamp as microseconds since the epoch; strings that would not format back the same are kept as they are."""
+    if value is None:
+        return time.time_ns() // 1000
+    if not isinstance(value, str):
+        return value
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if moment.tzinfo is not None:
+        return value
+    micros = (moment - _EPOCH) // _MICROSECOND
+    return micros if _isoformat(micros) == value else value
+
+
+def _isoformat(value: Union[str, int]) -> str:
+    # Naive UTC, the format datetime.utcnow().isoformat() gave before
+    if isinstance(value, str):
+        return value
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _new_id() -> int:
+    # 128 random bits with the version and variant of a UUID4, without building a UUID object
+    bits = random.getrandbits(128)
+    return (bits & ~(0xF000 << 64) | (0x4000 << 64)) & ~(0xC000 << 48) | (0x8000 << 48)
+
+
+def _format_id(value: int) -> str:
+    # str(uuid.UUID(int=value)), without the UUID object
+    digits = "%032x" % value
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-{digits[16:20]}-{digits[20:]}"
+
+
+def _to_id(value: Union[str, int, None]) -> Union[str, int]:
+    """UUIDs are kept as 128-bit ints; ids in any other format are kept as they are."""
+    if value is None:
+        return _new_id()
+    if not isinstance(value, str):
+        return value
+    try:
+        number = uuid.UUID(value).int
+    except ValueError:
+        return value
+    return number if _format_id(number) == value else value
+
+
+@dataclass(frozen=True, init=False, eq=False)
 class Message():
+    """One message of a chat; immutable once created.
+
+    Every chat in memory holds up to MAX_MESSAGES of these, so the id is kept
+    as a 128-bit int and the timestamp as microseconds since the epoch. The
+    timestamp is formatted whenever it is read, the id once, on the first
+    send, since every later payload of the chat repeats it.
+    """
+
+    __slots__ = ("role", "content", "image", "_id", "_timestamp", "_id_text")
+
     role: str
     content: str
-    image: Optional[str] = None
-    id: str = None
-    timestamp: str = None
+    image: Optional[str]
+    id: str
+    timestamp: str
+
+    def __init__(self, role: str, content: str, image: Optional[str] = None,
+                 id: Union[str, int, None] = None, timestamp: Union[str, int, None] = None):
+        object.__setattr__(self, "role", role)
+        object.__setattr__(self, "content", content)
+        object.__setattr__(self, "image", image)
+        object.__setattr__(self, "_id", _to_id(id))
+        object.__setattr__(self, "_timestamp", _to_micros(timestamp))
+        object.__setattr__(self, "_id_text", None)
 
-    def __post_init__(self):
-        if not self.id:
-            self.id = str(uuid.uuid4())
-        if not self.timestamp:
-            self.timestamp = datetime.utcnow().isoformat()
+    @property
+    def id(self) -> str:
+        id_text = self._id_text
+        if id_text is None:
+            id_text = self._id if isinstance(self._id, str) else _format_id(self._id)
+            object.__setattr__(self, "_id_text", id_text)
+        return id_text
+
+    @property
+    def timestamp(self) -> str:
+        return _isoformat(self._timestamp)
 
     def to_dict(self) -> Dict[str, Any]:
+        # The slot is read directly, the property only formats the id the first time:
+        # this runs for every message of every payload
         if self.image:
             return {
-                "id": self.id,
+                "id": self._id_text or self.id,
                 "content": self.content,
                 "role": self.role,
                 "data": {
@@ -66,42 +175,82 @@ class Message():
                 }
             }
         return {
-            "id": self.id,
+            "id": self._id_text or self.id,
             "content": self.content,
             "role": self.role,
         }
 
-@dataclass
+    def __reduce__(self):
+        return (Message, (self.role, self.content, self.image, self._id, self._timestamp))
+
+    def _key(self) -> Tuple[Any, ...]:
+        return (self.role, self.content, self.image, self._id, self._timestamp)
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+
 class Chat():
+    """The last MAX_MESSAGES messages of a chat.
+
+    created_at is kept as a number and formatted only when read.
+    """
+
     MAX_MESSAGES = 25
 
+    __slots__ = ("database", "chat_id", "messages", "metadata", "_created_at")
+
     def __init__(self, database: DatabaseInterface, chat_id: str = None):
         self.database = database
         self.chat_id = chat_id or str(uuid.uuid4())
         self.messages = deque(maxlen=self.MAX_MESSAGES)
-        self.created_at = datetime.utcnow().isoformat()
+        self._created_at = time.time_ns() // 1000
         self.metadata = {
             "message_count": 0,
             "last_updated": self.created_at
         }
 
+    @property
+    def created_at(self) -> str:
+        return _isoformat(self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: Union[str, int]) -> None:
+        self._created_at = _to_micros(value)
+
+    @property
+    def message_count(self) -> int:
+        return self.metadata["message_count"]
+
+    def _append(self, content: str, role: str, image: Optional[str]) -> Tuple[Message, bool]:
+        """Add a message in memory; also tells whether the oldest one was dropped."""
+        message = Message(role, content, image)
+        overflow = len(self.messages) == self.messages.maxlen
+        self.messages.append(message)
+        self.metadata["message_count"] += 1
+        self.metadata["last_updated"] = _isoformat(message._timestamp)
+        return message, overflow
+
     def add_message(self, content: str, role: str, image: Optional[str] = None) -> None:
         if self.database.database_type is not DatabaseType.Synchronous and self.database.database_type is not DatabaseType.Universal:
             raise DatabaseTypeError("Synchronous or Universal database type required")
-        message = Message(content=content, role=role, image=image)
-        self.messages.append(message)
-        self.metadata["message_count"] += 1
-        self.metadata["last_updated"] = datetime.utcnow().isoformat()
-        self.database.save_chat(self)
+        message, overflow = self._append(content, role, image)
+        self.database.append_message(self, message)
+        if overflow:
+            self.database.trim_to(self.chat_id, self.MAX_MESSAGES)
 
     async def add_message_async(self, content: str, role: str, image: Optional[str] = None) -> None:
         if self.database.database_type is not DatabaseType.Asynchronous and self.database.database_type is not DatabaseType.Universal:
             raise DatabaseTypeError("Asynchronous or Universal database type required")
-        message = Message(content=content, role=role, image=image)
-        self.messages.append(message)
-        self.metadata["message_count"] += 1
-        self.metadata["last_updated"] = datetime.utcnow().isoformat()
-        await self.database.save_chat_async(self)
+        message, overflow = self._append(content, role, image)
+        await self.database.append_message_async(self, message)
+        if overflow:
+            await self.database.trim_to_async(self.chat_id, self.MAX_MESSAGES)
 
     def get_messages(self) -> List[Message]:
         return self.messages
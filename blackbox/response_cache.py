@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def completion_cache_key(payload: Dict[str, Any]) -> str:
+    """Hash of everything in a /api/chat payload that determines the answer.
+
+    Message and chat ids and the validated token are left out, and images are
+    reduced to a digest of their data.
+    """
+    messages = []
+    for message in payload.get("messages", []):
+        image = (message.get("data") or {}).get("imageBase64")
+        messages.append([
+            message.get("role"),
+            message.get("content"),
+            hashlib.sha256(image.encode()).hexdigest() if image else None,
+        ])
+    normalized = {
+        "messages": messages,
+        "model": payload.get("userSelectedModel"),
+        "agent": payload.get("agentMode"),
+        "maxTokens": payload.get("maxTokens"),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Opt-in store of completed answers keyed by completion_cache_key().
+
+    Coroutines use get_async/set_async; backends that block (disk, locks
+    held by other processes) run them off the event loop.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        return self.get(key)
+
+    async def set_async(self, key: str, value: str) -> None:
+        self.set(key, value)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+
+class LRUResponseCache(ResponseCache):
+    """In-memory cache evicting the least recently used answers.
+
+    Bounded by number of entries and, optionally, by total size of the
+    cached answers in bytes (UTF-8).
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return False
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry[2]):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TTLResponseCache(LRUResponseCache):
+    """LRU cache whose answers also expire ttl seconds after being stored."""
+
+    def __init__(self, ttl: float, max_entries: int = 1024, max_bytes: Optional[int] = None):
+        super().__init__(max_entries, max_bytes)
+        self.ttl = ttl
+
+    def _is_expired(self, created_at: float) -> bool:
+        return time.monotonic() - created_at >= self.ttl
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk cache in SQLite, evicting least recently used rows past its bounds."""
+
+    def __init__(self, path: str,
+                 max_entries: int = 100000,
+                 max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    # BEGIN IMMEDIATE may wait up to the busy timeout for another process, never on the event loop
+
+    async def get_async(self, key: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    async def set_async(self, key: str, value: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, value)
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] >= self.ttl:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now)
+                )
+                self._evict(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        count, total = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        excess = max(count - self.max_entries, 0)
+        if excess:
+            connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (excess,)
+            )
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self.max_bytes is None:
+            return
+        while total > self.max_bytes:
+            row = connection.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            connection.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            total -= row[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from blackbox.exceptions import CircuitOpenError
+
+
+@dataclass
+class RetryPolicy:
+    """How failed /api/chat requests are retried.
+
+    Only failures that happen before any part of the answer was received are
+    retried: connection errors, connect timeouts and the statuses in
+    retry_statuses.
+    The delay grows exponentially with full jitter, unless the server sent a
+    Retry-After; a requested wait longer than max_delay is not retried.
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RequestMetrics:
+    """Counters of the request layer, readable at any time via snapshot()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self.breaker_state = CircuitBreaker.CLOSED
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+        data["breaker_state"] = self.breaker_state
+        return data
+
+
+class CircuitBreaker:
+    """Fails requests fast while the endpoint keeps failing.
+
+    After failure_threshold consecutive failures the breaker opens and
+    rejects requests for recovery_time seconds, then lets a single probe
+    through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = self.CLOSED
+        self.metrics: Optional[RequestMetrics] = None
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        if self.metrics is not None:
+            self.metrics.breaker_state = state
+            self.metrics.increment(f"breaker_{state}")
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_time:
+                    raise CircuitOpenError("Circuit breaker is open, /api/chat is failing")
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError("Circuit breaker is half-open, waiting for probe request")
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """Forget a request that ended without telling anything about the endpoint."""
+        with self._lock:
+            self._probing = False
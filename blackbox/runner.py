@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from blackbox.client import AIClient
+
+T = TypeVar("T")
+
+class LoopThread:
+    """Persistent event loop in a daemon thread backing the synchronous API.
+
+    Every sync call of a client is scheduled onto the same loop, so they
+    share its pooled session and keep-alive connections instead of paying for
+    a fresh loop and connection on each call. Safe to use from many threads.
+    """
+
+    def __init__(self, client: "AIClient"):
+        self.client = client
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The background loop, started on first use."""
+        with self._lock:
+            if self._loop is None:
+                self.client._log("Starting background event loop", "DEBUG")
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever,
+                                                name="blackbox-loop",
+                                                daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Run a coroutine on the background loop and wait for its result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Synchronous API can't be used from the client's own event loop")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, iterator: AsyncIterator[T]) -> Iterator[T]:
+        """Drive an async iterator on the background loop from synchronous code."""
+        try:
+            while True:
+                try:
+                    item = self.run(iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield item
+        finally:
+            self.run(iterator.aclose())
+
+    def close(self) -> None:
+        """Close the loop's session and stop the thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+
+        if loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self.client.session_manager.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        self.client._log("Stopped background event loop", "DEBUG")
@@ -0,0 +1,103 @@
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONSerializer:
+    """Stdlib JSON, compact and UTF-8 encoded."""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def dumps_str(self, obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+class OrjsonSerializer(JSONSerializer):
+    """orjson, several times faster than json on large payloads (pip install orjson)."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def dumps_str(self, obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+
+def default_serializer() -> JSONSerializer:
+    """orjson when it is installed, the stdlib otherwise."""
+    return OrjsonSerializer() if orjson is not None else JSONSerializer()
+
+
+# Stands in for an image that is written separately; random, so no message text can contain it
+IMAGE_SLOT = f"image-slot-{uuid.uuid4().hex}"
+
+Fragment = Tuple[bytes, ...]
+
+
+class MessageFragments:
+    """Serialized messages, reused on every later turn of a chat.
+
+    A fragment is the JSON of one message, split around IMAGE_SLOT when its
+    image is written separately. Messages are identified by id, role,
+    content and image, so an edited message is serialized anew. The cache is
+    an LRU bounded by the size of the fragments; max_bytes 0 disables it.
+    """
+
+    def __init__(self, serializer: Optional[JSONSerializer] = None, max_bytes: int = 32 * 1024 * 1024):
+        self.serializer = serializer or default_serializer()
+        self.max_bytes = max_bytes
+        self._fragments: "OrderedDict[Tuple[Any, ...], Fragment]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, message: Dict[str, Any], image_slot: bool = False) -> Fragment:
+        data = message.get("data")
+        content = message.get("content")
+        image = data.get("imageBase64") if data else None
+        # Hashes of str objects are cached by Python, and keeping them instead of
+        # the strings keeps large data URIs from outliving their chats here
+        key = (message.get("id"), message.get("role"), hash(content), len(content or ""), hash(image), image_slot)
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+
+        fragment = self._serialize(message, image_slot)
+        size = sum(len(part) for part in fragment)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key not in self._fragments:
+                    self._fragments[key] = fragment
+                    self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._fragments.popitem(last=False)
+                    self._bytes -= sum(len(part) for part in evicted)
+        return fragment
+
+    def _serialize(self, message: Dict[str, Any], image_slot: bool) -> Fragment:
+        if not image_slot:
+            return (self.serializer.dumps(message),)
+        message = {**message, "data": {**message["data"], "imageBase64": IMAGE_SLOT}}
+        head, tail = self.serializer.dumps(message).split(IMAGE_SLOT.encode("ascii"), 1)
+        return head, tail
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fragments.clear()
+            self._bytes = 0
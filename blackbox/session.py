@@ -0,0 +1,81 @@
+import asyncio
+import aiohttp
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from blackbox.client import AIClient
+
+@dataclass
+class Timeouts:
+    """Deadlines in seconds for a single API request; None disables one.
+
+    connect: establishing the TCP/TLS connection
+    first_byte: from sending the request to the first body chunk, so the
+        wait for the response headers counts against it too
+    read: between two consecutive body chunks
+    total: the whole request including reading the body
+    """
+    connect: Optional[float] = 10.0
+    first_byte: Optional[float] = 120.0
+    read: Optional[float] = 60.0
+    total: Optional[float] = 600.0
+
+    def to_client_timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=self.total, sock_connect=self.connect)
+
+class SessionManager:
+    """Owns the pooled aiohttp sessions shared by every request of a client.
+
+    aiohttp sessions are bound to the event loop they were created on, so one
+    session (and connection pool) is kept per running loop.
+    """
+
+    def __init__(self, client: "AIClient",
+                 limit: int = 100,
+                 limit_per_host: int = 20,
+                 keepalive_timeout: float = 30.0,
+                 ttl_dns_cache: Optional[int] = 300):
+        self.client = client
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+        return aiohttp.ClientSession(connector=connector,
+                                     timeout=self.client.timeouts.to_client_timeout(),
+                                     json_serialize=self.client.json_serializer.dumps_str)
+
+    async def get(self) -> aiohttp.ClientSession:
+        """Return the pooled session of the running loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        self._prune()
+
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            self.client._log("Opening pooled HTTP session", "DEBUG")
+            session = self._create_session()
+            self._sessions[loop] = session
+        return session
+
+    def _prune(self) -> None:
+        # Sessions of loops that are already gone can't be closed anymore
+        for loop in [loop for loop in self._sessions if loop.is_closed()]:
+            self._sessions.pop(loop, None)
+
+    async def close(self) -> None:
+        """Close the session that belongs to the running loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            self.client._log("Closing pooled HTTP session", "DEBUG")
+            await session.close()
+        self._prune()
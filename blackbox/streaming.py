@@ -0,0 +1,84 @@
+from typing import List
+
+
+class ResponseCleaner:
+    """Incrementally strips service markers from a streamed response.
+
+    Mirrors ``Completions._process_response`` but works on arbitrary chunk
+    boundaries: text that may still turn into a ``$~~~$...$~~~$`` block or the
+    BLACKBOX.AI banner is held back until it can be decided.
+    """
+
+    MARKER = "$~~~$"
+    BANNER = "Generated by BLACKBOX.AI, try unlimited chat https://www.blackbox.ai\n"
+
+    def __init__(self):
+        self._pending = ""
+        self._banner_pending = ""
+
+    def feed(self, text: str) -> str:
+        """Add a decoded chunk and return the part that is safe to emit."""
+        return self._strip_banner(self._strip_markers(text, final=False), final=False)
+
+    def flush(self) -> str:
+        """Return everything still held back once the response has ended."""
+        return self._strip_banner(self._strip_markers("", final=True), final=True)
+
+    def _strip_markers(self, text: str, final: bool) -> str:
+        buffer = self._pending + text
+        output: List[str] = []
+
+        while True:
+            start = buffer.find(self.MARKER)
+            if start == -1:
+                held = 0 if final else self._partial_suffix(buffer, self.MARKER)
+                output.append(buffer[:len(buffer) - held])
+                buffer = buffer[len(buffer) - held:]
+                break
+
+            end = buffer.find(self.MARKER, start + len(self.MARKER))
+            output.append(buffer[:start])
+            if end == -1:
+                # Unterminated block: wait for the closing marker, or keep it as is at the end
+                buffer = buffer[start:]
+                if final:
+                    output.append(buffer)
+                    buffer = ""
+                break
+            buffer = buffer[end + len(self.MARKER):]
+
+        self._pending = buffer
+        return "".join(output)
+
+    def _strip_banner(self, text: str, final: bool) -> str:
+        buffer = self._banner_pending + text
+        output: List[str] = []
+
+        while True:
+            start = buffer.find(self.BANNER)
+            if start == -1:
+                held = 0 if final else self._partial_suffix(buffer, self.BANNER)
+                output.append(buffer[:len(buffer) - held])
+                buffer = buffer[len(buffer) - held:]
+                break
+
+            end = start + len(self.BANNER)
+            output.append(buffer[:start])
+            if end == len(buffer) and not final:
+                # The banner may still be followed by one more newline
+                buffer = buffer[start:]
+                break
+            if buffer[end:end + 1] == "\n":
+                end += 1
+            buffer = buffer[end:]
+
+        self._banner_pending = buffer
+        return "".join(output)
+
+    @staticmethod
+    def _partial_suffix(text: str, pattern: str) -> int:
+        """Length of the longest suffix of text that is a prefix of pattern."""
+        for size in range(min(len(text), len(pattern) - 1), 0, -1):
+            if pattern.startswith(text[-size:]):
+                return size
+        return 0
@@ -8,6 +8,9 @@ class DatabaseType(Enum):
     Universal = "universal"
 
 class DatabaseInterface(ABC):
+    # Whether chats outlive the process; anything but an in-memory store is assumed to
+    persistent = True
+
     def __init__(self, database_type: DatabaseType):
         self.database_type = database_type
 
@@ -15,6 +18,27 @@ class DatabaseInterface(ABC):
     def save_chat(self, chat) -> None:
         pass
 
+    # Incremental persistence: a new message is appended instead of the whole chat
+    # being saved again. Backends that keep chats as a whole don't need to override
+    # these, by default they fall back to save_chat.
+
+    def append_message(self, chat, message) -> None:
+        """Persist message, just appended to chat, together with the chat metadata."""
+        self.save_chat(chat)
+
+    def append_messages(self, chat, messages) -> None:
+        """Persist several messages appended to chat, oldest first."""
+        for message in messages:
+            self.append_message(chat, message)
+
+    def trim_to(self, chat_id: str, count: int) -> None:
+        """Keep only the newest count messages of a chat."""
+        pass
+
+    def flush(self) -> None:
+        """Write out anything buffered; called when the client is closed."""
+        pass
+
     @abstractmethod
     def get_chat(self, chat_id: str):
         pass
@@ -43,6 +67,19 @@ class DatabaseInterface(ABC):
     async def save_chat_async(self, chat) -> None:
         pass
 
+    async def append_message_async(self, chat, message) -> None:
+        await self.save_chat_async(chat)
+
+    async def append_messages_async(self, chat, messages) -> None:
+        for message in messages:
+            await self.append_message_async(chat, message)
+
+    async def trim_to_async(self, chat_id: str, count: int) -> None:
+        pass
+
+    async def flush_async(self) -> None:
+        pass
+
     @abstractmethod
     async def get_chat_async(self, chat_id: str):
         pass
@@ -1,123 +1,277 @@
-import os
-import json
 from datetime import datetime, timedelta
 import re
+import asyncio
+import codecs
+import threading
 import aiohttp
-import requests
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+from blackbox.cache import CacheBackend, FileCache
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from blackbox.client import AIClient
 
 class Validation:
+    _key_pattern = re.compile(r'w="([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"')
+    _key_overlap = 64
+
     def __init__(self, client: "AIClient"):
         self.client = client
         self._validated_cache_file = "validated_cache.json"
+        # Shared between worker processes; only one of them refreshes at a time
+        self._cache: CacheBackend = client.cache or FileCache(self._validated_cache_file)
+        self._cache_key = "validated"
+        self._shared_lock_timeout = 30.0
+        self._rejected_value: Optional[str] = None
         self._validated_cache_ttl = timedelta(hours=4)
+        # Renew this long before the TTL runs out, serving the current value meanwhile
+        self._validated_refresh_margin = timedelta(minutes=30)
         self._last_validated_value = None
+        self._validated_at: Optional[datetime] = None
+        self._refresh_timer: Optional[asyncio.TimerHandle] = None
+        self._refresh_timer_for: Optional[datetime] = None
+        self._refresh_retry_interval = timedelta(minutes=1)
+        self._refresh_not_before: Optional[datetime] = None
+        # Refresh shared by every concurrent caller, whatever loop or thread it runs on
+        self._refresh_future: Optional[Future] = None
+        self._refresh_lock = threading.Lock()
+        # JS chunk that contained the value last time, scanned first on refresh
+        self._last_chunk_file: Optional[str] = None
+        self._chunk_concurrency = 6
+        self._chunk_read_size = 16384
 
         self._load_validated_from_cache()
 
 
     def _load_validated_from_cache(self) -> None:
-        """Load validated value from cache file if it exists and is not expired."""
+        """Load validated value from the shared cache if it exists and is not expired."""
+        cached = self._read_cached_validated()
+        if cached:
+            self._last_validated_value, self._validated_at = cached
+            self.client._log(f"Loaded validated value from cache: {self._last_validated_value}", "DEBUG")
+
+    def _read_cached_validated(self) -> Optional[Tuple[str, datetime]]:
         try:
-            if os.path.exists(self._validated_cache_file):
-                with open(self._validated_cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                    cached_time = datetime.fromisoformat(cache_data['timestamp'])
-                    if datetime.utcnow() - cached_time < self._validated_cache_ttl:
-                        self._last_validated_value = cache_data['value']
-                        self.client._log(f"Loaded validated value from cache: {self._last_validated_value}", "DEBUG")
+            cache_data = self._cache.get(self._cache_key)
+            if cache_data:
+                cached_time = datetime.fromisoformat(cache_data['timestamp'])
+                if datetime.utcnow() - cached_time < self._validated_cache_ttl:
+                    return cache_data['value'], cached_time
         except Exception as e:
             self.client._log(f"Failed to load validated cache: {str(e)}", "ERROR")
+        return None
 
     def _save_validated_to_cache(self, value: str) -> None:
-        """Save validated value to cache file."""
+        """Save validated value to the shared cache."""
         try:
             cache_data = {
                 'value': value,
-                'timestamp': datetime.utcnow().isoformat()
+                'timestamp': (self._validated_at or datetime.utcnow()).isoformat()
             }
-            with open(self._validated_cache_file, 'w') as f:
-                json.dump(cache_data, f)
+            self._cache.set(self._cache_key, cache_data)
             self.client._log("Saved validated value to cache", "DEBUG")
         except Exception as e:
             self.client._log(f"Failed to save validated cache: {str(e)}", "ERROR")
 
     async def fetch_validated_async(self) -> str:
         """Fetch validated value from Blackbox website JS files.
+
+        Concurrent callers share a single fetch and all receive its result.
+        A cached value close to expiry is still returned while a refresh
+        runs in the background.
         
         Returns:
             str: Validated value for API requests
         """
         # Проверяем кэш в памяти
         if self._last_validated_value:
+            self._schedule_refresh()
             return self._last_validated_value
 
+        return await self._refresh_async()
+
+    async def _refresh_async(self) -> str:
+        future, leader = self._join_refresh()
+        if not leader:
+            self.client._log("Waiting for in-flight validated value fetch", "DEBUG")
+            # shield() keeps a cancelled waiter from cancelling the fetch for everyone else
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        value = self._last_validated_value
+        validated_at = self._validated_at
+        try:
+            value = await self._refresh_shared_async()
+        finally:
+            with self._refresh_lock:
+                self._refresh_future = None
+                if self._validated_at == validated_at:
+                    # Nothing new was found: retry later instead of on every request
+                    self._refresh_timer_for = None
+                    self._refresh_not_before = datetime.utcnow() + self._refresh_retry_interval
+            future.set_result(value)
+        return value
+
+    async def _refresh_shared_async(self) -> str:
+        """Refresh under the cross-process lock, reusing a value another worker just stored."""
+        loop = asyncio.get_running_loop()
+        acquiring = loop.run_in_executor(None, self._cache.acquire, self._cache_key, self._shared_lock_timeout)
+        try:
+            acquired = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(lambda f: f.result() and self._cache.release(self._cache_key))
+            raise
+
+        try:
+            cached = self._read_cached_validated()
+            if cached and cached[0] != self._rejected_value and (self._validated_at is None or cached[1] > self._validated_at):
+                self.client._log("Using validated value refreshed by another worker", "DEBUG")
+                self._last_validated_value, self._validated_at = cached
+                return self._last_validated_value
+            return await self._scrape_validated_async()
+        finally:
+            if acquired:
+                self._cache.release(self._cache_key)
+
+    def invalidate(self, value: Optional[str] = None) -> None:
+        """Forget the cached value, e.g. after the API rejected it.
+
+        If value is given, the cache is only cleared while it still holds it,
+        so a token that has already been renewed is kept.
+        """
+        with self._refresh_lock:
+            if value is None or value == self._last_validated_value:
+                self.client._log("Invalidating validated value", "DEBUG")
+                self._rejected_value = self._last_validated_value
+                self._last_validated_value = None
+                self._validated_at = None
+
+    def _schedule_refresh(self) -> None:
+        """Make sure the cached value gets renewed before it expires."""
+        with self._refresh_lock:
+            validated_at = self._validated_at
+            if validated_at is None or self._refresh_future is not None or self._refresh_timer_for == validated_at:
+                return
+            self._refresh_timer_for = validated_at
+
+        refresh_at = validated_at + self._validated_cache_ttl - self._validated_refresh_margin
+        if self._refresh_not_before is not None:
+            refresh_at = max(refresh_at, self._refresh_not_before)
+        delay = (refresh_at - datetime.utcnow()).total_seconds()
+        loop = self.client.loop_thread.loop
+        loop.call_soon_threadsafe(self._arm_refresh_timer, loop, max(delay, 0))
+
+    def _arm_refresh_timer(self, loop: asyncio.AbstractEventLoop, delay: float) -> None:
+        # Runs on the client's loop thread, which owns the timer
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        self.client._log(f"Scheduling validated value refresh in {delay:.0f}s", "DEBUG")
+        self._refresh_timer = loop.call_later(delay, self._on_refresh_timer)
+
+    def _on_refresh_timer(self) -> None:
+        self._refresh_timer = None
+        self.client._log("Refreshing validated value in background", "DEBUG")
+        asyncio.ensure_future(self._refresh_async())
+
+    def _join_refresh(self) -> Tuple[Future, bool]:
+        """Return the in-flight refresh and whether the caller has to perform it."""
+        with self._refresh_lock:
+            if self._refresh_future is None:
+                self._refresh_future = Future()
+                return self._refresh_future, True
+            return self._refresh_future, False
+
+    async def _scrape_validated_async(self) -> str:
         # Пытаемся получить новое значение
 
         self.client._log("Fetching validated value from Blackbox website", "DEBUG")
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(self.client.base_url) as response:
-                    if response.status != 200:
-                        self.client._log("Failed to load the main page", "ERROR")
-                        return self._last_validated_value
-                    
-                    page_content = await response.text()
-                    js_files = re.findall(r'static/chunks/\d{4}-[a-fA-F0-9]+\.js', page_content)
-
-                key_pattern = re.compile(r'w="([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"')
-
-                for js_file in js_files:
-                    js_url = f"{self.client.base_url}/_next/{js_file}"
-                    async with session.get(js_url) as js_response:
-                        if js_response.status == 200:
-                            js_content = await js_response.text()
-                            match = key_pattern.search(js_content)
-                            if match:
-                                validated_value = match.group(1)
-                                self._last_validated_value = validated_value
-                                # Сохраняем новое значение в кэш
-                                self._save_validated_to_cache(validated_value)
-                                return validated_value
-                                
-            except Exception as e:
-                self.client._log(f"Error fetching validated value: {str(e)}", "ERROR")
+        session = await self.client.session_manager.get()
+        try:
+            async with session.get(self.client.base_url) as response:
+                if response.status != 200:
+                    self.client._log("Failed to load the main page", "ERROR")
+                    return self._last_validated_value
+                
+                page_content = await response.text()
+                js_files = re.findall(r'static/chunks/\d{4}-[a-fA-F0-9]+\.js', page_content)
+
+            # Сначала проверяем файл, в котором значение нашлось в прошлый раз
+            js_files = list(dict.fromkeys(js_files))
+            if self._last_chunk_file in js_files:
+                validated_value = await self._scan_chunk(session, self._last_chunk_file)
+                if validated_value:
+                    return self._store_validated(validated_value, self._last_chunk_file)
+                js_files.remove(self._last_chunk_file)
+
+            found = await self._scan_chunks(session, js_files)
+            if found:
+                return self._store_validated(*found)
+
+        except Exception as e:
+            self.client._log(f"Error fetching validated value: {str(e)}", "ERROR")
 
         return self._last_validated_value
     
-    def fetch_validated(self) -> str:
-        if self._last_validated_value:
-            return self._last_validated_value
-        
+    async def _scan_chunks(self, session: aiohttp.ClientSession, js_files: List[str]) -> Optional[Tuple[str, str]]:
+        """Scan chunk files in parallel and return (value, file) of the first hit.
+
+        Downloads still running when the value is found are cancelled.
+        """
+        semaphore = asyncio.Semaphore(self._chunk_concurrency)
+
+        async def scan(js_file: str) -> Optional[Tuple[str, str]]:
+            async with semaphore:
+                validated_value = await self._scan_chunk(session, js_file)
+            return (validated_value, js_file) if validated_value else None
+
+        tasks = [asyncio.ensure_future(scan(js_file)) for js_file in js_files]
         try:
-            response = requests.get(self.client.base_url)
-            if response.status_code != 200:
-                self.client._log("Failed to load the main page", "ERROR")
-                return self._last_validated_value
-            
-            page_content = response.text
-            js_files = re.findall(r'static/chunks/\d{4}-[a-fA-F0-9]+\.js', page_content)
-
-            key_pattern = re.compile(r'w="([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"')
-
-            for js_file in js_files:
-                js_url = f"{self.client.base_url}/_next/{js_file}"
-                js_response = requests.get(js_url)
-                if js_response.status_code == 200:
-                    js_content = js_response.text
-                    match = key_pattern.search(js_content)
-                    if match:
-                        validated_value = match.group(1)
-                        self._last_validated_value = validated_value
-                        self._save_validated_to_cache(validated_value)
-                        return validated_value
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    found = await next_done
+                except Exception as e:
+                    self.client._log(f"Failed to scan JS chunk: {str(e)}", "ERROR")
+                    continue
+                if found:
+                    return found
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _scan_chunk(self, session: aiohttp.ClientSession, js_file: str) -> Optional[str]:
+        """Search a chunk file for the validated value while it downloads."""
+        js_url = f"{self.client.base_url}/_next/{js_file}"
+        async with session.get(js_url) as js_response:
+            if js_response.status != 200:
+                return None
+
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            tail = ""
+            async for chunk in js_response.content.iter_chunked(self._chunk_read_size):
+                window = tail + decoder.decode(chunk)
+                match = self._key_pattern.search(window)
+                if match:
+                    # Leaving the block drops the connection instead of reading the rest
+                    return match.group(1)
+                # Keep enough of the end to catch a match split between chunks
+                tail = window[-self._key_overlap:]
+        return None
+
+    def _store_validated(self, validated_value: str, js_file: str) -> str:
+        self._last_validated_value = validated_value
+        self._validated_at = datetime.utcnow()
+        self._last_chunk_file = js_file
+        # Сохраняем новое значение в кэш
+        self._save_validated_to_cache(validated_value)
+        return validated_value
 
+    def fetch_validated(self) -> str:
+        """Thread-safe synchronous counterpart of :meth:`fetch_validated_async`."""
+        if self._last_validated_value:
+            self._schedule_refresh()
             return self._last_validated_value
-        except Exception as e:
-            self.client._log(f"Error fetching validated value: {str(e)}", "ERROR")
 
-        return self._last_validated_value
+        return self.client.loop_thread.run(self.fetch_validated_async())
@@ -25,6 +25,9 @@ setup(
         "yarl==1.18.3",
         "setuptools==75.8.0"
     ],
+    extras_require={
+        "orjson": ["orjson>=3.9"],
+    },
     python_requires=">=3.8",
     author="Keva1z",
     author_email="Keva1z@yandex.ru",
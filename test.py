@@ -7,13 +7,13 @@ from blackbox.types import DatabaseInterface, DatabaseType
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import delete
+from sqlalchemy import delete, update, func
 from blackbox.models import Chat
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import select
 from typing import List
 from sqlalchemy import Column, String, JSON
-from test_models import Base, ChatModel
+from test_models import Base, ChatModel, MessageModel
 
 class AsyncSQLiteDatabase(DatabaseInterface):
     def __init__(self):
@@ -49,25 +49,52 @@ class AsyncSQLiteDatabase(DatabaseInterface):
             await conn.run_sync(self.Base.metadata.create_all)
 
     async def save_chat_async(self, chat: Chat) -> None:
+        # Полная перезапись чата, нужна только при очистке истории
         async with self.session() as session:
-            chat_model = ChatModel.from_chat(chat)
             async with session.begin():
-                # Пробуем найти существующую запись
-                existing = await session.get(ChatModel, chat.chat_id)
-                if existing:
-                    # Обновляем существующую запись
-                    existing.created_at = chat_model.created_at
-                    existing.chat_metadata = chat_model.chat_metadata
-                    existing.messages = chat_model.messages
-                else:
-                    # Создаем новую запись
-                    session.add(chat_model)
+                await session.merge(ChatModel.from_chat(chat))
+                await session.execute(delete(MessageModel).where(MessageModel.chat_id == chat.chat_id))
+                session.add_all(MessageModel.from_chat(chat))
+
+    async def append_message_async(self, chat: Chat, message) -> None:
+        # Один ход пишет одну строку сообщения и обновляет метаданные чата
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(
+                    update(ChatModel)
+                    .where(ChatModel.chat_id == chat.chat_id)
+                    .values(chat_metadata=dict(chat.metadata))
+                )
+                seq = MessageModel.seq_of(chat, message)
+                if seq is not None:
+                    session.add(MessageModel.from_message(chat.chat_id, seq, message))
+
+    async def trim_to_async(self, chat_id: str, count: int) -> None:
+        async with self.session() as session:
+            async with session.begin():
+                last_seq = (
+                    select(func.max(MessageModel.seq))
+                    .where(MessageModel.chat_id == chat_id)
+                    .scalar_subquery()
+                )
+                await session.execute(
+                    delete(MessageModel)
+                    .where(MessageModel.chat_id == chat_id, MessageModel.seq <= last_seq - count)
+                )
+
+    async def _load_chat(self, session: AsyncSession, chat_model: ChatModel, database: DatabaseInterface) -> Chat:
+        result = await session.execute(
+            select(MessageModel)
+            .where(MessageModel.chat_id == chat_model.chat_id)
+            .order_by(MessageModel.seq)
+        )
+        return chat_model.to_chat(database, result.scalars().all())
 
     async def get_chat_async(self, chat_id: str) -> Chat:
         async with self.session() as session:
             chat_model = await session.get(ChatModel, chat_id)
             if chat_model:
-                return chat_model.to_chat(self)
+                return await self._load_chat(session, chat_model, self)
             return None
         
     async def get_or_create_chat_async(self, database: 'DatabaseInterface', chat_id: str) -> Chat:
@@ -79,26 +106,33 @@ class AsyncSQLiteDatabase(DatabaseInterface):
                 session.add(chat_model)
                 await session.commit()
                 return chat
-            return chat_model.to_chat(database)
+            return await self._load_chat(session, chat_model, database)
     
     async def get_all_chats_async(self) -> List[Chat]:
         async with self.session() as session:
             result = await session.execute(select(ChatModel))
-            return [chat_model.to_chat(self) for chat_model in result.scalars()]
+            return [await self._load_chat(session, chat_model, self) for chat_model in result.scalars().all()]
     
     async def clear_chat_history_async(self, chat_id: str) -> None:
         async with self.session() as session:
-            await session.execute(delete(Chat).where(Chat.chat_id == chat_id))
+            await session.execute(delete(MessageModel).where(MessageModel.chat_id == chat_id))
+            await session.execute(
+                update(ChatModel)
+                .where(ChatModel.chat_id == chat_id)
+                .values(chat_metadata={"message_count": 0})
+            )
             await session.commit()
     
     async def clear_all_chats_async(self) -> None:
         async with self.session() as session:
-            await session.execute(delete(Chat))
+            await session.execute(delete(MessageModel))
+            await session.execute(delete(ChatModel))
             await session.commit()
     
     async def delete_chat_async(self, chat_id: str) -> None:
         async with self.session() as session:
-            await session.delete(await session.get(Chat, chat_id))
+            await session.execute(delete(MessageModel).where(MessageModel.chat_id == chat_id))
+            await session.execute(delete(ChatModel).where(ChatModel.chat_id == chat_id))
             await session.commit()
         
 
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, JSON
+from sqlalchemy import Column, String, JSON, Integer, Text, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from blackbox.models import Chat, Message
+from typing import List
 
 Base = declarative_base()
 
@@ -10,25 +11,17 @@ class ChatModel(Base):
     chat_id = Column(String, primary_key=True)
     created_at = Column(String)
     chat_metadata = Column(JSON)
-    messages = Column(JSON)  # Будем хранить сообщения как JSON
 
-    def to_chat(self, database) -> 'Chat':
-        from blackbox.models import Chat, Message
+    def to_chat(self, database, messages: List['MessageModel']) -> 'Chat':
+        from blackbox.models import Chat
         
         chat = Chat(database, self.chat_id)
         chat.created_at = self.created_at
         chat.metadata = self.chat_metadata
         
-        # Конвертируем JSON сообщений обратно в объекты Message
-        for msg_dict in self.messages:
-            message = Message(
-                content=msg_dict['content'],
-                role=msg_dict['role'],
-                id=msg_dict['id'],
-                timestamp=msg_dict.get('timestamp'),
-                image=msg_dict.get('image')
-            )
-            chat.messages.append(message)
+        # Сообщения хранятся отдельными строками, по порядку seq
+        for message_model in messages:
+            chat.messages.append(message_model.to_message())
             
         return chat
 
@@ -37,12 +30,54 @@ class ChatModel(Base):
         return ChatModel(
             chat_id=chat.chat_id,
             created_at=chat.created_at,
-            chat_metadata=chat.metadata,
-            messages=[{
-                'content': msg.content,
-                'role': msg.role,
-                'id': msg.id,
-                'timestamp': msg.timestamp,
-                'image': msg.image
-            } for msg in chat.messages]
+            chat_metadata=dict(chat.metadata)
         )
+
+class MessageModel(Base):
+    __tablename__ = 'messages'
+
+    # Первичный ключ (chat_id, seq) заодно служит индексом для чтения чата по порядку
+    chat_id = Column(String, ForeignKey('chats.chat_id', ondelete='CASCADE'), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    id = Column(String)
+    role = Column(String)
+    content = Column(Text)
+    image = Column(Text)
+    timestamp = Column(String)
+
+    def to_message(self) -> 'Message':
+        return Message(
+            content=self.content,
+            role=self.role,
+            id=self.id,
+            timestamp=self.timestamp,
+            image=self.image
+        )
+
+    @staticmethod
+    def from_message(chat_id: str, seq: int, message: 'Message') -> 'MessageModel':
+        return MessageModel(
+            chat_id=chat_id,
+            seq=seq,
+            id=message.id,
+            role=message.role,
+            content=message.content,
+            image=message.image,
+            timestamp=message.timestamp
+        )
+
+    @staticmethod
+    def seq_of(chat: 'Chat', message: 'Message') -> int:
+        # Позиция сообщения в чате, а не текущий счётчик: запись может быть отложена
+        first_seq = chat.message_count - len(chat.messages) + 1
+        for i, chat_message in enumerate(chat.messages):
+            if chat_message is message:
+                return first_seq + i
+        return None
+
+    @staticmethod
+    def from_chat(chat: 'Chat') -> List['MessageModel']:
+        # message_count только растёт, поэтому последнее сообщение всегда имеет seq == message_count
+        first_seq = chat.message_count - len(chat.messages) + 1
+        return [MessageModel.from_message(chat.chat_id, first_seq + i, message)
+                for i, message in enumerate(chat.messages)]